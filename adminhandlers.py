@@ -1,22 +1,31 @@
 import logging
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes, ConversationHandler, CommandHandler, MessageHandler, filters, CallbackQueryHandler
+from telegram.constants import ParseMode
 from config import ADMIN_IDS, CHANNEL_ID
-from database import Movie
-from utils import parse_movie_title, is_admin
+from database import db, Movie, get_movie_by_id, invalidate_movie_cache
+from utils import parse_movie_title, is_admin, safe_md
 from peewee import IntegrityError
 
 # Conversation states
 TITLE, DESCRIPTION, MESSAGE_ID, CONFIRM = range(4)
 
+# Only let admin updates reach the admin command handlers
+ADMIN_FILTER = filters.User(user_id=ADMIN_IDS)
+
+# Number of movies shown per /listmovies page
+MOVIES_PER_PAGE = 50
+
+# Confirmation keyboard for new movies, built once and shared (PTB objects are immutable)
+CONFIRM_ADD_BUTTON = InlineKeyboardButton("✅ Confirm", callback_data="confirm_add")
+CANCEL_ADD_BUTTON = InlineKeyboardButton("❌ Cancel", callback_data="cancel_add")
+CONFIRM_ADD_KEYBOARD = InlineKeyboardMarkup([[CONFIRM_ADD_BUTTON, CANCEL_ADD_BUTTON]])
+
+# Channel message IDs already verified to exist, so they are not forwarded again
+verified_message_ids = set()
+
 async def start_add_movie(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Start the add movie conversation."""
-    user_id = update.effective_user.id
-    
-    if not is_admin(user_id, ADMIN_IDS):
-        await update.message.reply_text("Sorry, only admins can use this command.")
-        return ConversationHandler.END
-    
     # Check if we have movie details already
     args = context.args
     if args:
@@ -28,14 +37,14 @@ async def start_add_movie(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await update.message.reply_text(
             f"Adding movie: *{title}*" + (f" ({year})" if year else "") + 
             "\n\nPlease provide a brief description of the movie, or send /skip to skip this step.",
-            parse_mode='Markdown'
+            parse_mode=ParseMode.MARKDOWN
         )
         return DESCRIPTION
     
     await update.message.reply_text(
         "Please send the movie title with optional year in parentheses.\n"
         "Example: `The Matrix (1999)`",
-        parse_mode='Markdown'
+        parse_mode=ParseMode.MARKDOWN
     )
     return TITLE
 
@@ -48,7 +57,7 @@ async def title_received(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     await update.message.reply_text(
         f"Adding movie: *{title}*" + (f" ({year})" if year else "") + 
         "\n\nPlease provide a brief description of the movie, or send /skip to skip this step.",
-        parse_mode='Markdown'
+        parse_mode=ParseMode.MARKDOWN
     )
     return DESCRIPTION
 
@@ -92,35 +101,31 @@ async def message_id_received(update: Update, context: ContextTypes.DEFAULT_TYPE
         
         # Try to verify the message exists in the channel
         try:
-            message = await context.bot.forward_message(
-                chat_id=update.effective_chat.id,
-                from_chat_id=CHANNEL_ID,
-                message_id=message_id
-            )
-            
-            # Message found, delete the forwarded copy to keep chat clean
-            await message.delete()
-            logging.info(f"Successfully verified message ID: {message_id}")
+            if message_id not in verified_message_ids:
+                message = await context.bot.forward_message(
+                    chat_id=update.effective_chat.id,
+                    from_chat_id=CHANNEL_ID,
+                    message_id=message_id,
+                    disable_notification=True
+                )
+                
+                # Message found, delete the forwarded copy in the background to keep chat clean
+                context.application.create_task(message.delete())
+                verified_message_ids.add(message_id)
+                logging.info(f"Successfully verified message ID: {message_id}")
             
             # Show confirmation
             title = context.user_data['movie_title']
             year = context.user_data.get('movie_year')
             year_str = f" ({year})" if year else ""
             
-            keyboard = [
-                [
-                    InlineKeyboardButton("✅ Confirm", callback_data="confirm_add"),
-                    InlineKeyboardButton("❌ Cancel", callback_data="cancel_add")
-                ]
-            ]
-            
             await update.message.reply_text(
                 f"Ready to add *{title}*{year_str} to the database.\n\n"
                 f"Message ID: `{message_id}`\n"
-                f"Description: {context.user_data.get('movie_description', 'None')}\n\n"
+                f"Description: {safe_md(context.user_data.get('movie_description') or 'None')}\n\n"
                 "Is this correct?",
-                reply_markup=InlineKeyboardMarkup(keyboard),
-                parse_mode='Markdown'
+                reply_markup=CONFIRM_ADD_KEYBOARD,
+                parse_mode=ParseMode.MARKDOWN
             )
             return CONFIRM
             
@@ -161,18 +166,20 @@ async def confirm_add_movie(update: Update, context: ContextTypes.DEFAULT_TYPE)
     
     # Add movie to database
     try:
-        movie = Movie.create(
-            title=title,
-            year=year,
-            description=context.user_data.get('movie_description'),
-            message_id=message_id,
-            added_by=user_id
-        )
+        with db.connection_context():
+            movie = Movie.create(
+                title=title,
+                year=year,
+                description=context.user_data.get('movie_description'),
+                message_id=message_id,
+                added_by=user_id
+            )
+        invalidate_movie_cache()
         
         await query.edit_message_text(
             f"✅ Movie *{movie.title}*" + (f" ({movie.year})" if movie.year else "") + 
             " has been successfully added to the database!",
-            parse_mode='Markdown'
+            parse_mode=ParseMode.MARKDOWN
         )
         
     except IntegrityError as e:
@@ -205,63 +212,103 @@ async def cancel_add_movie(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     await update.message.reply_text("Operation cancelled.")
     return ConversationHandler.END
 
-async def list_movies(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """List all movies in the database."""
-    user_id = update.effective_user.id
+def build_movie_list_page(page: int):
+    """
+    Build one page of the movie list.
     
-    if not is_admin(user_id, ADMIN_IDS):
-        await update.message.reply_text("Sorry, only admins can use this command.")
-        return
+    Returns:
+        tuple: (message text, navigation keyboard), or (None, None) if there are no movies
+    """
+    total_movies = Movie.select().count()
+    if total_movies == 0:
+        return None, None
     
-    movies = Movie.select().order_by(Movie.title)
+    total_pages = (total_movies + MOVIES_PER_PAGE - 1) // MOVIES_PER_PAGE
+    page = max(1, min(page, total_pages))
     
-    if not movies:
-        await update.message.reply_text("No movies in the database yet.")
-        return
+    # Only fetch the rows and columns shown on this page
+    movies = (Movie
+              .select(Movie.id, Movie.title, Movie.year)
+              .order_by(Movie.title)
+              .paginate(page, MOVIES_PER_PAGE))
     
     movie_list = []
     for movie in movies:
         year_str = f" ({movie.year})" if movie.year else ""
-        movie_list.append(f"• {movie.title}{year_str} - ID: {movie.id}")
+        movie_list.append(f"• {safe_md(movie.title)}{year_str} - ID: {movie.id}")
+    
+    header = "🎬 *Movie Database*" if total_pages == 1 else f"🎬 *Movie Database (page {page}/{total_pages})*"
+    message = header + "\n\n" + "\n".join(movie_list)
     
-    # Split into chunks if the list is too long
-    chunks = [movie_list[i:i+50] for i in range(0, len(movie_list), 50)]
+    # Add navigation buttons for the neighbouring pages
+    buttons = []
+    if page > 1:
+        buttons.append(InlineKeyboardButton("◀️ Previous", callback_data=f"listmovies_{page - 1}"))
+    if page < total_pages:
+        buttons.append(InlineKeyboardButton("Next ▶️", callback_data=f"listmovies_{page + 1}"))
+    keyboard = InlineKeyboardMarkup([buttons]) if buttons else None
     
-    for i, chunk in enumerate(chunks):
-        header = "🎬 *Movie Database*" if i == 0 else f"*Movie Database (continued {i+1}/{len(chunks)})*"
-        message = header + "\n\n" + "\n".join(chunk)
-        await update.message.reply_text(message, parse_mode='Markdown')
+    return message, keyboard
 
-async def delete_movie(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Delete a movie by ID."""
-    user_id = update.effective_user.id
+async def list_movies(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """List all movies in the database."""
+    with db.connection_context():
+        message, keyboard = build_movie_list_page(1)
+    
+    if not message:
+        await update.message.reply_text("No movies in the database yet.")
+        return
+    
+    await update.message.reply_text(message, reply_markup=keyboard, parse_mode=ParseMode.MARKDOWN)
+
+async def list_movies_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show another page of the movie list from the navigation buttons."""
+    query = update.callback_query
+    
+    if not is_admin(update.effective_user.id):
+        await query.answer("Sorry, only admins can use this command.", show_alert=True)
+        return
     
-    if not is_admin(user_id, ADMIN_IDS):
-        await update.message.reply_text("Sorry, only admins can use this command.")
+    await query.answer()
+    
+    page = int(query.data.split('_')[-1])
+    with db.connection_context():
+        message, keyboard = build_movie_list_page(page)
+    
+    if not message:
+        await query.edit_message_text("No movies in the database yet.")
         return
     
+    await query.edit_message_text(message, reply_markup=keyboard, parse_mode=ParseMode.MARKDOWN)
+
+async def delete_movie(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Delete a movie by ID."""
     args = context.args
     if not args or not args[0].isdigit():
-        await update.message.reply_text("Please provide a valid movie ID: `/deletemovie <id>`", parse_mode='Markdown')
+        await update.message.reply_text("Please provide a valid movie ID: `/deletemovie <id>`", parse_mode=ParseMode.MARKDOWN)
         return
     
     movie_id = int(args[0])
     
-    try:
-        movie = Movie.get_by_id(movie_id)
-        title = movie.title
-        year = movie.year
-        movie.delete_instance()
-        
-        year_str = f" ({year})" if year else ""
-        await update.message.reply_text(f"Movie *{title}*{year_str} has been deleted.", parse_mode='Markdown')
+    with db.connection_context():
+        movie = get_movie_by_id(movie_id)
+        if movie is not None:
+            movie.delete_instance()
     
-    except Movie.DoesNotExist:
+    if movie is None:
         await update.message.reply_text(f"No movie found with ID {movie_id}.")
+        return
+    
+    invalidate_movie_cache(movie_id)
+    title = movie.title
+    year = movie.year
+    
+    year_str = f" ({year})" if year else ""
+    await update.message.reply_text(f"Movie *{title}*{year_str} has been deleted.", parse_mode=ParseMode.MARKDOWN)
 
 # Create the conversation handler for adding movies
 add_movie_handler = ConversationHandler(
-    entry_points=[CommandHandler("addmovie", start_add_movie)],
+    entry_points=[CommandHandler("addmovie", start_add_movie, filters=ADMIN_FILTER)],
     states={
         TITLE: [MessageHandler(filters.TEXT & ~filters.COMMAND, title_received)],
         DESCRIPTION: [
@@ -275,6 +322,7 @@ add_movie_handler = ConversationHandler(
 )
 
 # Other admin handlers
-list_movies_handler = CommandHandler("listmovies", list_movies)
-delete_movie_handler = CommandHandler("deletemovie", delete_movie)
+list_movies_handler = CommandHandler("listmovies", list_movies, filters=ADMIN_FILTER, block=False)
+list_movies_page_handler = CallbackQueryHandler(list_movies_page, pattern=r"^listmovies_\d+$", block=False)
+delete_movie_handler = CommandHandler("deletemovie", delete_movie, filters=ADMIN_FILTER, block=False)
       
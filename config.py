@@ -1,56 +1,86 @@
 import os
+import re
 import logging
+from collections import defaultdict
+from typing import NamedTuple
 from dotenv import load_dotenv
 
-# Load environment variables
-load_dotenv()
+# Variables the bot can't start without
+REQUIRED_ENV_VARS = ("BOT_TOKEN", "ADMIN_ID", "CHANNEL_ID", "AUTH_GRP")
+
+# Load environment variables, unless the environment (e.g. a container) already
+# provides every required one, in which case .env is not read at all; variables
+# already set are never overridden by .env
+if not all(name in os.environ for name in REQUIRED_ENV_VARS):
+    load_dotenv()
 
 # Bot configuration
 BOT_TOKEN = os.getenv("BOT_TOKEN")
-ADMIN_IDS = [int(id) for id in os.getenv("ADMIN_ID").split(",")]
+# Sets give constant-time membership checks on every update
+ADMIN_IDS = frozenset(int(id) for id in os.getenv("ADMIN_ID").split(","))
 CHANNEL_ID = int(os.getenv("CHANNEL_ID"))
-AUTH_GROUPS = [int(id) for id in os.getenv("AUTH_GRP").split(",")]
+AUTH_GROUPS = frozenset(int(id) for id in os.getenv("AUTH_GRP").split(","))
 DATABASE_URL = os.getenv("DATABASE_URL", "movies.db")
 
+# Webhook configuration; the bot falls back to long polling without PUBLIC_URL
+PUBLIC_URL = os.getenv("PUBLIC_URL", "").rstrip("/")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_PORT = int(os.getenv("PORT", "8443"))
+
+class RequiredChannel(NamedTuple):
+    """A channel users must join before they can use the bot."""
+    channel_id: int
+    channel_name: str
+    invite_link: str
+
+# Matches REQUIRED_CHANNEL<n>_ID, REQUIRED_CHANNEL<n>_NAME and REQUIRED_CHANNEL<n>_LINK
+REQUIRED_CHANNEL_PATTERN = re.compile(r"REQUIRED_CHANNEL([1-9]\d*)_(ID|NAME|LINK)$")
+
 # Dynamic channel configuration
 def get_required_channels():
-    """Dynamically build the list of required channels from environment variables."""
+    """Dynamically build the tuple of required channels from environment variables."""
+    # Collect all channel settings in a single pass over the environment
+    settings = defaultdict(dict)
+    for key, value in os.environ.items():
+        match = REQUIRED_CHANNEL_PATTERN.match(key)
+        if match:
+            settings[int(match.group(1))][match.group(2)] = value
+    
     channels = []
     i = 1
     
-    while True:
-        channel_id_key = f"REQUIRED_CHANNEL{i}_ID"
-        channel_id = os.getenv(channel_id_key)
-        
-        if not channel_id:
-            break  # No more channels defined
-            
-        channels.append({
-            'channel_id': int(channel_id),
-            'channel_name': os.getenv(f"REQUIRED_CHANNEL{i}_NAME", f"Channel {i}"),
-            'invite_link': os.getenv(f"REQUIRED_CHANNEL{i}_LINK", f"https://t.me/channel{i}")
-        })
+    # Channels are numbered from 1; stop at the first one without an ID
+    while settings[i].get("ID"):
+        channel = settings[i]
+        channels.append(RequiredChannel(
+            channel_id=int(channel["ID"]),
+            channel_name=channel.get("NAME", f"Channel {i}"),
+            invite_link=channel.get("LINK", f"https://t.me/channel{i}")
+        ))
         
         i += 1
     
     # If no channels were defined, use the main channel as a fallback
     if not channels:
-        channels.append({
-            'channel_id': CHANNEL_ID,
-            'channel_name': "FlickFusion Movies",
-            'invite_link': os.getenv("REQUIRED_CHANNEL1_LINK", "https://t.me/your_channel")
-        })
+        channels.append(RequiredChannel(
+            channel_id=CHANNEL_ID,
+            channel_name="FlickFusion Movies",
+            invite_link=settings[1].get("LINK", "https://t.me/your_channel")
+        ))
     
-    return channels
+    # Built once at import and never modified
+    return tuple(channels)
 
 # Force join configuration
 REQUIRED_CHANNELS = get_required_channels()
 
 # Log the channels that will be required
 logger = logging.getLogger(__name__)
-logger.info(f"Requiring membership in {len(REQUIRED_CHANNELS)} channels:")
-for i, channel in enumerate(REQUIRED_CHANNELS):
-    logger.info(f"  {i+1}. {channel['channel_name']} (ID: {channel['channel_id']})")
+# Only format the channel list if INFO messages are actually emitted
+if logger.isEnabledFor(logging.INFO):
+    logger.info("Requiring membership in %d channels:", len(REQUIRED_CHANNELS))
+    for i, channel in enumerate(REQUIRED_CHANNELS, start=1):
+        logger.info("  %d. %s (ID: %s)", i, channel.channel_name, channel.channel_id)
 
 # Validate configuration
 if not all([BOT_TOKEN, ADMIN_IDS, CHANNEL_ID, AUTH_GROUPS]):
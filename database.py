@@ -1,21 +1,45 @@
 
 from peewee import *
+from playhouse.pool import PooledSqliteDatabase, PooledPostgresqlDatabase
+from cachetools import TTLCache
+from concurrent.futures import ThreadPoolExecutor
 from config import DATABASE_URL
+import asyncio
 import datetime
 import logging
 
-# Set up logging
-logging.basicConfig(level=logging.INFO, 
-                   format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+# Logging is configured by main.py
 logger = logging.getLogger(__name__)
 
+# Connection pool settings
+DB_MAX_CONNECTIONS = 8
+DB_STALE_TIMEOUT = 300  # Seconds before an idle connection is recycled
+
+# Each worker thread of run_query holds a pooled connection of its own, so there
+# are fewer of them than connections; one is left for queries made on the event loop
+DB_QUERY_THREADS = DB_MAX_CONNECTIONS - 1
+query_executor = ThreadPoolExecutor(max_workers=DB_QUERY_THREADS, thread_name_prefix="db-query")
+
+# Batched write settings
+WRITE_FLUSH_INTERVAL = 0.5  # Seconds between batched writes
+# Rows per statement, keeping under older SQLite variable limits
+REQUEST_LOG_BATCH_SIZE = 200
+USER_UPDATE_BATCH_SIZE = 100
+
+# Movie lookup cache settings
+MOVIE_CACHE_SIZE = 1024
+MOVIE_CACHE_TTL = 300  # Seconds before a cached lookup is refetched
+
 # Database connection
 # Determine database type based on URL
+# Connections are pooled so handlers reuse them instead of reconnecting
 if DATABASE_URL.endswith('.db'):
-    db = SqliteDatabase(DATABASE_URL)
+    # Pooled connections may be handed to worker threads (see run_query)
+    db = PooledSqliteDatabase(DATABASE_URL, max_connections=DB_MAX_CONNECTIONS, stale_timeout=DB_STALE_TIMEOUT,
+                              check_same_thread=False)
     logger.info(f"Using SQLite database: {DATABASE_URL}")
 else:
-    db = PostgresqlDatabase(DATABASE_URL)
+    db = PooledPostgresqlDatabase(DATABASE_URL, max_connections=DB_MAX_CONNECTIONS, stale_timeout=DB_STALE_TIMEOUT)
     logger.info(f"Using PostgreSQL database: {DATABASE_URL}")
 
 class BaseModel(Model):
@@ -45,6 +69,12 @@ class RequestLog(BaseModel):
     request_time = DateTimeField(default=datetime.datetime.now)
     # Change to BigIntegerField for Telegram group IDs
     group_id = BigIntegerField(null=True)
+    
+    class Meta:
+        indexes = (
+            # Covers counting distinct active users over a recent time window
+            (('request_time', 'user_id'), False),
+        )
 
 # Add User model for force join functionality
 class User(BaseModel):
@@ -53,12 +83,185 @@ class User(BaseModel):
     first_name = CharField()
     last_name = CharField(null=True)
     is_member = BooleanField(default=False)
-    last_checked = DateTimeField(default=datetime.datetime.now)
+    # Indexed for the periodic scan of users whose membership is due for a recheck
+    last_checked = DateTimeField(default=datetime.datetime.now, index=True)
     joined_date = DateTimeField(default=datetime.datetime.now)
 
+# Telegram file IDs of photos sent by URL, kept so they survive restarts
+class PhotoFileId(BaseModel):
+    url = CharField(max_length=500, primary_key=True)
+    file_id = CharField()
+
+# Popular titles are requested over and over, so keep recent lookups in memory
+movie_cache = TTLCache(maxsize=MOVIE_CACHE_SIZE, ttl=MOVIE_CACHE_TTL)
+movie_title_cache = TTLCache(maxsize=MOVIE_CACHE_SIZE, ttl=MOVIE_CACHE_TTL)
+
+def get_movie_by_id(movie_id):
+    """Return the movie with the given ID, using the cache when possible.
+
+    Returns None if there is no such movie.
+    """
+    movie = movie_cache.get(movie_id)
+    if movie is None:
+        movie = Movie.get_or_none(Movie.id == movie_id)
+        if movie is not None:
+            movie_cache[movie_id] = movie
+    return movie
+
+def find_movie_by_title(title, year=None):
+    """Return the first movie whose title contains `title`, using the cache when possible.
+
+    Returns None if nothing matches.
+    """
+    # Title matching is case-insensitive, so the lowercased title is a safe key
+    key = (title.lower(), year)
+    movie = movie_title_cache.get(key)
+    if movie is None:
+        query = Movie.select().where(Movie.title.contains(title))
+        if year:
+            query = query.where(Movie.year == year)
+        movie = query.first()
+        if movie is not None:
+            movie_title_cache[key] = movie
+            movie_cache[movie.id] = movie
+    return movie
+
+def invalidate_movie_cache(movie_id=None):
+    """Drop cached lookups after a movie is added or deleted."""
+    if movie_id is not None:
+        movie_cache.pop(movie_id, None)
+    # Any write can change which movie a title search matches first
+    movie_title_cache.clear()
+
+# Request logs waiting to be written by the next flush
+pending_request_logs = []
+
+def log_request(user_id, movie_id, group_id=None):
+    """Queue a movie request log; it is written with the next batch."""
+    pending_request_logs.append({
+        'user_id': user_id,
+        'movie_id': movie_id,
+        'group_id': group_id,
+        # Stamp the request now rather than when the batch is written
+        'request_time': datetime.datetime.now(),
+    })
+
+def flush_request_logs():
+    """Write all queued request logs using multi-row INSERTs."""
+    if not pending_request_logs:
+        return
+    
+    # Take the whole batch at once so logs queued meanwhile wait for the next flush
+    batch = pending_request_logs[:]
+    pending_request_logs.clear()
+    
+    with db.connection_context():
+        with db.atomic():
+            for rows in chunked(batch, REQUEST_LOG_BATCH_SIZE):
+                RequestLog.insert_many(rows).execute()
+
+# Latest membership state per user waiting for the next flush; a newer
+# update for the same user replaces the queued one
+pending_user_updates = {}
+
+def queue_user_update(user_id, username, first_name, last_name, is_member):
+    """Queue a user's checked membership; it is written with the next batch."""
+    pending_user_updates[user_id] = {
+        'user_id': user_id,
+        'username': username,
+        'first_name': first_name or "User",
+        'last_name': last_name,
+        'is_member': is_member,
+        'last_checked': datetime.datetime.now(),
+    }
+
+def flush_user_updates():
+    """Upsert all queued user updates using multi-row INSERT ... ON CONFLICT."""
+    if not pending_user_updates:
+        return
+    
+    batch = list(pending_user_updates.values())
+    pending_user_updates.clear()
+    
+    with db.connection_context():
+        with db.atomic():
+            for rows in chunked(batch, USER_UPDATE_BATCH_SIZE):
+                User.insert_many(rows).on_conflict(
+                    conflict_target=[User.user_id],
+                    update={
+                        User.is_member: EXCLUDED.is_member,
+                        User.last_checked: EXCLUDED.last_checked,
+                        User.first_name: EXCLUDED.first_name,
+                        # Keep the optional names we already have if Telegram didn't send them
+                        User.username: fn.COALESCE(EXCLUDED.username, User.username),
+                        User.last_name: fn.COALESCE(EXCLUDED.last_name, User.last_name),
+                    }
+                ).execute()
+
+def flush_pending_writes():
+    """Write everything queued for the database."""
+    # Flush each queue separately so one failing write doesn't hold up the other
+    for flush, name in ((flush_request_logs, "request logs"), (flush_user_updates, "user updates")):
+        try:
+            flush()
+        except Exception as e:
+            logger.error(f"Error writing queued {name}: {e}")
+
+async def database_writer():
+    """Flush queued writes periodically until cancelled."""
+    while True:
+        await asyncio.sleep(WRITE_FLUSH_INTERVAL)
+        flush_pending_writes()
+
+def load_photo_file_ids():
+    """Return the stored photo file IDs, keyed by photo URL."""
+    with db.connection_context():
+        return dict(PhotoFileId.select(PhotoFileId.url, PhotoFileId.file_id).tuples())
+
+def save_photo_file_id(url, file_id):
+    """Store the file ID Telegram assigned to a photo sent by URL."""
+    with db.connection_context():
+        # INSERT ... ON CONFLICT runs on both SQLite and PostgreSQL, unlike REPLACE
+        PhotoFileId.insert(url=url, file_id=file_id).on_conflict(
+            conflict_target=[PhotoFileId.url],
+            update={PhotoFileId.file_id: file_id}
+        ).execute()
+
+async def run_query(func, *args):
+    """
+    Run blocking database work in a worker thread, so it doesn't stall the event loop.
+    
+    Work beyond DB_QUERY_THREADS queries at once waits for a free thread rather
+    than exceeding the connection pool.
+    
+    Args:
+        func: Function doing the queries; it runs on a pooled connection of its own
+        *args: Passed on to func
+    
+    Returns:
+        Whatever func returns
+    """
+    def run():
+        with db.connection_context():
+            return func(*args)
+    
+    return await asyncio.get_running_loop().run_in_executor(query_executor, run)
+
+# Indexes added after the tables were first created. create_tables(safe=True) only
+# adds indexes to existing tables on SQLite; PostgreSQL skips them, so existing
+# databases get them from these statements instead
+INDEX_MIGRATIONS = (
+    'CREATE INDEX IF NOT EXISTS "requestlog_request_time_user_id" ON "requestlog" ("request_time", "user_id")',
+    'CREATE INDEX IF NOT EXISTS "user_last_checked" ON "user" ("last_checked")',
+)
+
 def initialize_db():
     """Initialize the database and create tables if they don't exist."""
-    db.connect()
-    db.create_tables([Movie, RequestLog, User], safe=True)
-    logger.info("Database initialized with tables: Movie, RequestLog, User")
+    # Hand the connection back to the pool once the tables exist, rather than
+    # holding it for the lifetime of the bot
+    with db.connection_context():
+        db.create_tables([Movie, RequestLog, User, PhotoFileId], safe=True)
+        for statement in INDEX_MIGRATIONS:
+            db.execute_sql(statement)
+    logger.info("Database initialized with tables: Movie, RequestLog, User, PhotoFileId")
     return db
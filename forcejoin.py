@@ -1,21 +1,188 @@
+import asyncio
 import logging
 from functools import wraps
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes
-from telegram.error import TelegramError, BadRequest
+from telegram.constants import ParseMode
+from telegram.error import TelegramError
+from cachetools import TTLCache
 from config import REQUIRED_CHANNELS, ADMIN_IDS
-from database import User, db
+from database import User, db, queue_user_update
+from utils import WELCOME_PHOTO_URL, send_cached_photo
 import datetime
 
 logger = logging.getLogger(__name__)
 
-async def check_user_membership(user_id: int, context: ContextTypes.DEFAULT_TYPE) -> dict:
+# Chat member statuses that count as having joined a channel
+MEMBER_STATUSES = frozenset({'member', 'administrator', 'creator'})
+
+# How long a confirmed membership is trusted before checking again
+MEMBERSHIP_CACHE_TTL = 600  # Seconds
+MEMBERSHIP_CACHE_SIZE = 100000
+
+# Users recently confirmed as members of all channels, so repeat messages skip the database
+member_cache = TTLCache(maxsize=MEMBERSHIP_CACHE_SIZE, ttl=MEMBERSHIP_CACHE_TTL)
+
+# Detailed per-channel results are reused briefly, so repeated prompts and
+# /status calls don't query Telegram again for every message
+RESULTS_CACHE_TTL = 60  # Seconds
+results_cache = TTLCache(maxsize=MEMBERSHIP_CACHE_SIZE, ttl=RESULTS_CACHE_TTL)
+
+# Results for users missing a channel expire sooner, so joining takes effect quickly
+DENIED_RESULTS_CACHE_TTL = 30  # Seconds
+denied_results_cache = TTLCache(maxsize=MEMBERSHIP_CACHE_SIZE, ttl=DENIED_RESULTS_CACHE_TTL)
+
+# Maximum number of users whose channels are being looked up at once
+MEMBERSHIP_CHECK_CONCURRENCY = 25
+membership_check_semaphore = asyncio.Semaphore(MEMBERSHIP_CHECK_CONCURRENCY)
+
+# Full membership checks in progress, so repeated messages or button presses
+# from the same user share one round of lookups
+inflight_checks = {}
+
+# Static message texts, built once at import
+WELCOME_TEXT = (
+    "*🎬 Welcome to FlickFusion, Movie Lover! 🍿*\n\n"
+    "Hey there! I'm *FlickFusion*, your go-to bot for instant movie magic. 🪄 "
+    "Need a film? Just drop your request in the group, in this Format \"/search [Movie Name]\".\n\n"
+    "*Let's dive into the world of cinema. Sit back, grab popcorn, and enjoy! 🎥*\n\n"
+    "*Crafted with ❤️ by @ViperROX.*\n"
+    "Have questions? Just type /help or check your channel membership with /status!"
+)
+
+# Only "channel"/"channels" varies in the join prompt, so both versions are built once
+JOIN_PROMPT_TEMPLATE = (
+    "🎬 *FlickFusion Requires Channel Membership* 🍿\n\n"
+    "To access all the amazing movies and features, you need to join our {channel_text} first!\n\n"
+    "Please join the required {channel_text} below, then click the 'I've Joined All Channels' button."
+)
+JOIN_PROMPT_SINGULAR = JOIN_PROMPT_TEMPLATE.format(channel_text="channel")
+JOIN_PROMPT_PLURAL = JOIN_PROMPT_TEMPLATE.format(channel_text="channels")
+
+MISSING_CHANNELS_TEXT = (
+    "⚠️ *You still need to join the following channels:*\n"
+    "• {missing}\n\n"
+    "Please join all required channels, then click the 'I've Joined All Channels' button to access FlickFusion."
+)
+
+# Shown as the button's notification when a press changes nothing (plain text, not Markdown)
+STILL_MISSING_ANSWER = "You still need to join: {missing}"
+
+# The required channels are fixed at startup, so their join buttons are built once
+JOIN_BUTTONS = tuple(
+    (channel.channel_id, InlineKeyboardButton(f"📢 Join {channel.channel_name}", url=channel.invite_link))
+    for channel in REQUIRED_CHANNELS
+)
+CHECK_MEMBERSHIP_BUTTON = InlineKeyboardButton("✅ I've Joined All Channels", callback_data="check_membership")
+
+# Join prompt for users who haven't joined any channel yet, the most common case
+JOIN_ALL_MARKUP = InlineKeyboardMarkup([[button] for _, button in JOIN_BUTTONS] + [[CHECK_MEMBERSHIP_BUTTON]])
+
+def build_join_markup(results: dict) -> InlineKeyboardMarkup:
+    """
+    Build the join prompt keyboard for the channels a user hasn't joined yet.
+    
+    Args:
+        results: Membership results from check_user_membership
+    
+    Returns:
+        InlineKeyboardMarkup: A join button per missing channel, plus the check button
+    """
+    channels = results['channels']
+    rows = [
+        [button] for channel_id, button in JOIN_BUTTONS
+        if not channels.get(channel_id, {}).get('is_member', False)
+    ]
+    
+    if len(rows) == len(JOIN_BUTTONS):
+        return JOIN_ALL_MARKUP
+    
+    rows.append([CHECK_MEMBERSHIP_BUTTON])
+    return InlineKeyboardMarkup(rows)
+
+def record_channel_result(results: dict, user_id: int, channel, member):
+    """
+    Add one channel's membership lookup to the results.
+    
+    Args:
+        results: The results being built by check_user_membership
+        user_id: The user ID that was checked
+        channel: The RequiredChannel that was checked
+        member: The ChatMember returned by Telegram, or the exception raised instead
+    """
+    channel_id = channel.channel_id
+    channel_name = channel.channel_name
+    
+    if isinstance(member, TelegramError):
+        logger.error(f"Error checking membership for user {user_id} in channel {channel_name}: {member}")
+        # If we can't check, assume they're not a member
+        results['channels'][channel_id] = {
+            'name': channel_name,
+            'is_member': False,
+            'status': 'error',
+            'error': str(member)
+        }
+        results['is_member_of_all'] = False
+        return
+    elif isinstance(member, BaseException):
+        # Only Telegram API errors mean "couldn't check"; anything else is a real failure
+        raise member
+    
+    # Check if user is a member
+    is_member = member.status in MEMBER_STATUSES
+    results['channels'][channel_id] = {
+        'name': channel_name,
+        'is_member': is_member,
+        'status': member.status
+    }
+    
+    # Update overall status
+    if not is_member:
+        results['is_member_of_all'] = False
+        logger.info(f"User {user_id} is not a member of {channel_name} (ID: {channel_id})")
+
+async def check_user_membership(user_id: int, context: ContextTypes.DEFAULT_TYPE, force_refresh: bool = False, early_exit: bool = False) -> dict:
     """
     Check if a user is a member of all required channels.
     
     Args:
         user_id: The user ID to check
         context: The context object
+        force_refresh: Skip the results cache and always ask Telegram
+        early_exit: Stop as soon as one channel is missing, for callers that only
+            need 'is_member_of_all'; the per-channel results may then be incomplete
+    
+    Returns:
+        dict: Results with overall status and per-channel status
+    """
+    if not force_refresh:
+        cached = results_cache.get(user_id) or denied_results_cache.get(user_id)
+        if cached is not None:
+            return cached
+    
+    # A full check already running for this user answers this one too; it is
+    # shielded so that one caller giving up doesn't cancel it for the others
+    inflight = inflight_checks.get(user_id)
+    if inflight is not None:
+        return await asyncio.shield(inflight)
+    
+    if early_exit:
+        # Partial results can't be shared, so boolean-only checks run on their own
+        return await fetch_user_membership(user_id, context, early_exit=True)
+    
+    check = asyncio.ensure_future(fetch_user_membership(user_id, context))
+    inflight_checks[user_id] = check
+    check.add_done_callback(lambda _: inflight_checks.pop(user_id, None))
+    return await asyncio.shield(check)
+
+async def fetch_user_membership(user_id: int, context: ContextTypes.DEFAULT_TYPE, early_exit: bool = False) -> dict:
+    """
+    Look up a user's membership of every required channel with Telegram.
+    
+    Args:
+        user_id: The user ID to check
+        context: The context object
+        early_exit: Stop as soon as one channel is missing
     
     Returns:
         dict: Results with overall status and per-channel status
@@ -25,45 +192,46 @@ async def check_user_membership(user_id: int, context: ContextTypes.DEFAULT_TYPE
         'channels': {}
     }
     
-    # Check each required channel
-    for channel in REQUIRED_CHANNELS:
-        channel_id = channel['channel_id']
-        channel_name = channel['channel_name']
-        
-        try:
-            # Get chat member status
-            member = await context.bot.get_chat_member(chat_id=channel_id, user_id=user_id)
-            
-            # Check if user is a member
-            is_member = member.status in ['member', 'administrator', 'creator']
-            results['channels'][channel_id] = {
-                'name': channel_name,
-                'is_member': is_member,
-                'status': member.status
-            }
-            
-            # Update overall status
-            if not is_member:
-                results['is_member_of_all'] = False
-                logger.info(f"User {user_id} is not a member of {channel_name} (ID: {channel_id})")
-                
-        except (TelegramError, BadRequest) as e:
-            logger.error(f"Error checking membership for user {user_id} in channel {channel_name}: {e}")
-            # If we can't check, assume they're not a member
-            results['channels'][channel_id] = {
-                'name': channel_name,
-                'is_member': False,
-                'status': 'error',
-                'error': str(e)
-            }
-            results['is_member_of_all'] = False
+    # Keep bursts of checks from flooding Telegram's API all at once
+    async with membership_check_semaphore:
+        # Query all required channels at once, since the checks don't depend on each other
+        lookups = {
+            asyncio.ensure_future(context.bot.get_chat_member(chat_id=channel.channel_id, user_id=user_id)): channel
+            for channel in REQUIRED_CHANNELS
+        }
+    
+        if early_exit:
+            # Handle lookups as they finish and drop the rest once the answer is known
+            pending = set(lookups)
+            try:
+                while pending and results['is_member_of_all']:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for lookup in done:
+                        record_channel_result(results, user_id, lookups[lookup], lookup.exception() or lookup.result())
+            finally:
+                for lookup in pending:
+                    lookup.cancel()
+        else:
+            members = await asyncio.gather(*lookups, return_exceptions=True)
+            for channel, member in zip(lookups.values(), members):
+                record_channel_result(results, user_id, channel, member)
     
     if results['is_member_of_all']:
         logger.info(f"User {user_id} is a member of all {len(REQUIRED_CHANNELS)} required channels")
     
+    # Don't keep partial results, or results from failed lookups, so the next check redoes them
+    complete = len(results['channels']) == len(REQUIRED_CHANNELS)
+    if complete and not any(channel['status'] == 'error' for channel in results['channels'].values()):
+        if results['is_member_of_all']:
+            results_cache[user_id] = results
+            denied_results_cache.pop(user_id, None)
+        else:
+            denied_results_cache[user_id] = results
+            results_cache.pop(user_id, None)
+    
     return results
 
-async def update_user_membership(user_id: int, username: str, first_name: str, last_name: str, context: ContextTypes.DEFAULT_TYPE) -> bool:
+async def update_user_membership(user_id: int, username: str, first_name: str, last_name: str, context: ContextTypes.DEFAULT_TYPE, force_refresh: bool = False) -> tuple:
     """
     Check membership and update the database.
     
@@ -73,47 +241,26 @@ async def update_user_membership(user_id: int, username: str, first_name: str, l
         first_name: The first name
         last_name: The last name
         context: The context object
+        force_refresh: Skip the results cache and always ask Telegram
     
     Returns:
-        bool: True if user is a member of all channels, False otherwise
+        tuple: (is_member, results) - whether the user is a member of all channels,
+        and the detailed results from check_user_membership
     """
     # Check if user is a member of all channels
-    results = await check_user_membership(user_id, context)
+    results = await check_user_membership(user_id, context, force_refresh=force_refresh)
     is_member = results['is_member_of_all']
     
-    # Ensure database connection is open
-    if db.is_closed():
-        db.connect()
+    # Remember fresh positive results; a user who left must be checked again
+    if is_member:
+        member_cache[user_id] = True
+    else:
+        member_cache.pop(user_id, None)
     
-    try:
-        # Update user in database
-        try:
-            user = User.get(User.user_id == user_id)
-            user.is_member = is_member
-            user.last_checked = datetime.datetime.now()
-            if username:
-                user.username = username
-            if first_name:
-                user.first_name = first_name
-            if last_name:
-                user.last_name = last_name
-            user.save()
-        except User.DoesNotExist:
-            # Create new user record
-            User.create(
-                user_id=user_id,
-                username=username,
-                first_name=first_name or "User",
-                last_name=last_name,
-                is_member=is_member,
-                last_checked=datetime.datetime.now()
-            )
-    finally:
-        # Close the database connection
-        if not db.is_closed():
-            db.close()
+    # Queue the database write so it doesn't delay the reply to the user
+    queue_user_update(user_id, username, first_name, last_name, is_member)
     
-    return is_member
+    return is_member, results
 
 async def force_join(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
     """
@@ -131,33 +278,31 @@ async def force_join(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool
     # Skip check for admins
     if user_id in ADMIN_IDS:
         return True
+    
+    # Skip the database for users confirmed as members recently
+    if user_id in member_cache:
+        return True
         
-    now = datetime.datetime.now()
+    # Users verified before this are due for a recheck
+    fresh_since = datetime.datetime.now() - datetime.timedelta(seconds=MEMBERSHIP_CACHE_TTL)
     
-    # Ensure database connection is open
-    if db.is_closed():
-        db.connect()
+    # Borrow a pooled connection for the query; it is returned even on errors
+    with db.connection_context():
+        # If we checked recently and user is a member, return cached result
+        # Only recheck every 10 minutes to reduce API calls
+        # The database does the comparison, so no row has to be loaded
+        recently_verified = (User
+                             .select()
+                             .where((User.user_id == user_id) &
+                                    (User.is_member == True) &
+                                    (User.last_checked > fresh_since))
+                             .exists())
     
-    try:
-        # Try to get user from database
-        try:
-            user = User.get(User.user_id == user_id)
-            
-            # If we checked recently and user is a member, return cached result
-            # Only recheck every 10 minutes to reduce API calls
-            if user.is_member and (now - user.last_checked).total_seconds() < 600:
-                return True
-                
-        except User.DoesNotExist:
-            # User will be created in update_user_membership
-            pass
-    finally:
-        # Close the database connection
-        if not db.is_closed():
-            db.close()
-    
-    # Check membership and update database
-    is_member = await update_user_membership(
+    if recently_verified:
+        return True
+    
+    # Check membership and update database, creating the user if they are new
+    is_member, results = await update_user_membership(
         user_id=user_id,
         username=update.effective_user.username,
         first_name=update.effective_user.first_name,
@@ -166,52 +311,29 @@ async def force_join(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool
     )
     
     if not is_member:
-        # Get detailed membership status
-        results = await check_user_membership(user_id, context)
-        
         # User is not a member of all channels, create join buttons
-        buttons = []
-        
-        # Add a button for each channel the user needs to join
-        for channel in REQUIRED_CHANNELS:
-            channel_id = channel['channel_id']
-            channel_info = results['channels'].get(channel_id, {})
-            
-            # Only show button if user is not a member of this channel
-            if not channel_info.get('is_member', False):
-                buttons.append([InlineKeyboardButton(
-                    f"📢 Join {channel['channel_name']}", 
-                    url=channel['invite_link']
-                )])
+        reply_markup = build_join_markup(results)
         
-        # Add a "Check Again" button
-        buttons.append([InlineKeyboardButton("✅ I've Joined All Channels", callback_data="check_membership")])
-        
-        # Create message text
-        channel_count = len([c for c in results['channels'].values() if not c.get('is_member', False)])
-        channel_text = "channels" if channel_count > 1 else "channel"
+        # Pick the message text for the number of channels still to join
+        channel_count = sum(1 for c in results['channels'].values() if not c.get('is_member', False))
+        join_text = JOIN_PROMPT_PLURAL if channel_count > 1 else JOIN_PROMPT_SINGULAR
         
         # Create a branded message with FlickFusion style
         try:
-            await update.effective_message.reply_photo(
-                photo="https://i.ibb.co/N6b3MVpj/1741892600514.jpg",
-                caption=(
-                    f"🎬 *FlickFusion Requires Channel Membership* 🍿\n\n"
-                    f"To access all the amazing movies and features, you need to join our {channel_text} first!\n\n"
-                    f"Please join the required {channel_text} below, then click the 'I've Joined All Channels' button."
-                ),
-                reply_markup=InlineKeyboardMarkup(buttons),
-                parse_mode='Markdown'
+            await send_cached_photo(
+                update.effective_message.reply_photo,
+                WELCOME_PHOTO_URL,
+                caption=join_text,
+                reply_markup=reply_markup,
+                parse_mode=ParseMode.MARKDOWN
             )
         except Exception as e:
             logger.error(f"Failed to send photo message: {e}")
             # Fallback to text-only message
             await update.effective_message.reply_text(
-                f"🎬 *FlickFusion Requires Channel Membership* 🍿\n\n"
-                f"To access all the amazing movies and features, you need to join our {channel_text} first!\n\n"
-                f"Please join the required {channel_text} below, then click the 'I've Joined All Channels' button.",
-                reply_markup=InlineKeyboardMarkup(buttons),
-                parse_mode='Markdown'
+                join_text,
+                reply_markup=reply_markup,
+                parse_mode=ParseMode.MARKDOWN
             )
         return False
     
@@ -240,66 +362,40 @@ def require_membership(func):
 async def check_membership_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle the 'I've Joined All Channels' button click."""
     query = update.callback_query
-    await query.answer()
-    
     user_id = update.effective_user.id
     
-    # Check if user has joined all channels
-    is_member = await update_user_membership(
+    # Check if user has joined all channels; the button is answered once the
+    # result is known, so a repeat press can be told what is still missing
+    is_member, results = await update_user_membership(
         user_id=user_id,
         username=update.effective_user.username,
         first_name=update.effective_user.first_name,
         last_name=update.effective_user.last_name,
-        context=context
+        context=context,
+        # The user says they just joined, so an earlier result is stale
+        force_refresh=True
     )
     
     if is_member:
-        # User has joined all channels
+        # User has joined all channels; clear the button's loading spinner
+        # while the welcome text goes out rather than waiting for it first
+        answer = asyncio.ensure_future(query.answer())
         try:
             # Try to edit the caption if it's a photo message
             await query.edit_message_caption(
-                caption="*🎬 Welcome to FlickFusion, Movie Lover! 🍿*\n\n"
-                "Hey there! I'm *FlickFusion*, your go-to bot for instant movie magic. 🪄 "
-                "Need a film? Just drop your request in the group, in this Format \"/search [Movie Name]\".\n\n"
-                "*Let's dive into the world of cinema. Sit back, grab popcorn, and enjoy! 🎥*\n\n"
-                "*Crafted with ❤️ by @ViperROX.*\n"
-                "Have questions? Just type /help or check your channel membership with /status!",
-                parse_mode='Markdown'
+                caption=WELCOME_TEXT,
+                parse_mode=ParseMode.MARKDOWN
             )
         except Exception:
             # Fallback to editing text message
             await query.edit_message_text(
-                "*🎬 Welcome to FlickFusion, Movie Lover! 🍿*\n\n"
-                "Hey there! I'm *FlickFusion*, your go-to bot for instant movie magic. 🪄 "
-                "Need a film? Just drop your request in the group, in this Format \"/search [Movie Name]\".\n\n"
-                "*Let's dive into the world of cinema. Sit back, grab popcorn, and enjoy! 🎥*\n\n"
-                "*Crafted with ❤️ by @ViperROX.*\n"
-                "Have questions? Just type /help or check your channel membership with /status!",
-                parse_mode='Markdown'
+                WELCOME_TEXT,
+                parse_mode=ParseMode.MARKDOWN
             )
+        finally:
+            await answer
     else:
-        # Get detailed membership status
-        results = await check_user_membership(user_id, context)
-        
-        # User has not joined all channels
-        buttons = []
-        
-        # Add a button for each channel the user needs to join
-        for channel in REQUIRED_CHANNELS:
-            channel_id = channel['channel_id']
-            channel_info = results['channels'].get(channel_id, {})
-            
-            # Only show button if user is not a member of this channel
-            if not channel_info.get('is_member', False):
-                buttons.append([InlineKeyboardButton(
-                    f"📢 Join {channel['channel_name']}", 
-                    url=channel['invite_link']
-                )])
-        
-        # Add the "Check Again" button
-        buttons.append([InlineKeyboardButton("✅ I've Joined All Channels", callback_data="check_membership")])
-        
-        # Create message text with specific feedback
+        # User has not joined all channels; create message text with specific feedback
         missing_channels = [
             channel['name'] 
             for channel_id, channel in results['channels'].items() 
@@ -308,24 +404,33 @@ async def check_membership_callback(update: Update, context: ContextTypes.DEFAUL
         
         missing_text = ", ".join(missing_channels)
         
+        # If this message already lists exactly these channels, its buttons are
+        # the same too, so answer the press instead of editing the message again
+        shown = (query.message.message_id, tuple(missing_channels))
+        if context.user_data.get('missing_channels_shown') == shown:
+            # Telegram allows at most 200 characters here
+            await query.answer(STILL_MISSING_ANSWER.format(missing=missing_text)[:200])
+            return
+        context.user_data['missing_channels_shown'] = shown
+        
+        reply_markup = build_join_markup(results)
+        answer = asyncio.ensure_future(query.answer())
         try:
             # Try to edit the caption if it's a photo message
             await query.edit_message_caption(
-                caption="⚠️ *You still need to join the following channels:*\n"
-                f"• {missing_text}\n\n"
-                "Please join all required channels, then click the 'I've Joined All Channels' button to access FlickFusion.",
-                reply_markup=InlineKeyboardMarkup(buttons),
-                parse_mode='Markdown'
+                caption=MISSING_CHANNELS_TEXT.format(missing=missing_text),
+                reply_markup=reply_markup,
+                parse_mode=ParseMode.MARKDOWN
             )
         except Exception:
             # Fallback to editing text message
             await query.edit_message_text(
-                "⚠️ *You still need to join the following channels:*\n"
-                f"• {missing_text}\n\n"
-                "Please join all required channels, then click the 'I've Joined All Channels' button to access FlickFusion.",
-                reply_markup=InlineKeyboardMarkup(buttons),
-                parse_mode='Markdown'
+                MISSING_CHANNELS_TEXT.format(missing=missing_text),
+                reply_markup=reply_markup,
+                parse_mode=ParseMode.MARKDOWN
             )
+        finally:
+            await answer
 
 async def membership_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show the user's membership status for all required channels."""
@@ -338,7 +443,7 @@ async def membership_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     status_lines = ["🎬 *FlickFusion Channel Membership Status*\n"]
     
     for channel in REQUIRED_CHANNELS:
-        channel_id = channel['channel_id']
+        channel_id = channel.channel_id
         channel_info = results['channels'].get(channel_id, {})
         
         # Add status emoji
@@ -347,7 +452,7 @@ async def membership_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
         else:
             status_emoji = "❌"
             
-        status_lines.append(f"{status_emoji} {channel['channel_name']}")
+        status_lines.append(f"{status_emoji} {channel.channel_name}")
     
     # Add overall status
     status_lines.append("\n*Overall Status:*")
@@ -356,31 +461,16 @@ async def membership_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         status_lines.append("❌ You need to join all channels to use FlickFusion.")
         
-        # Add join buttons for channels the user hasn't joined
-        buttons = []
-        for channel in REQUIRED_CHANNELS:
-            channel_id = channel['channel_id']
-            channel_info = results['channels'].get(channel_id, {})
-            
-            if not channel_info.get('is_member', False):
-                buttons.append([InlineKeyboardButton(
-                    f"📢 Join {channel['channel_name']}", 
-                    url=channel['invite_link']
-                )])
-        
-        # Add check button
-        buttons.append([InlineKeyboardButton("✅ I've Joined All Channels", callback_data="check_membership")])
-        
-        # Send message with buttons
+        # Send message with join buttons for the channels still missing
         await update.message.reply_text(
             "\n".join(status_lines),
-            reply_markup=InlineKeyboardMarkup(buttons),
-            parse_mode='Markdown'
+            reply_markup=build_join_markup(results),
+            parse_mode=ParseMode.MARKDOWN
         )
         return
     
     # If they've joined all channels, just send the status message
     await update.message.reply_text(
         "\n".join(status_lines),
-        parse_mode='Markdown'
+        parse_mode=ParseMode.MARKDOWN
     )
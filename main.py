@@ -1,28 +1,172 @@
+import os
 import logging
+import logging.handlers
+import queue
 import datetime
 import asyncio
 import time
+import random
+import re
+from array import array
+from typing import Final
+from functools import lru_cache
+
+# Enable logging
+# Handlers only enqueue records; a background thread writes them out, so
+# logging never blocks the event loop on stderr
+log_queue = queue.SimpleQueue()
+log_stream_handler = logging.StreamHandler()
+log_stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+log_listener = logging.handlers.QueueListener(log_queue, log_stream_handler)
+log_queue_handler = logging.handlers.QueueHandler(log_queue)
+# The stream handler adds the full format; the queued record only needs its message
+log_queue_handler.setFormatter(logging.Formatter('%(message)s'))
+# Set up before the modules below are imported, so their startup messages are kept
+logging.basicConfig(level=logging.INFO, handlers=[log_queue_handler])
+log_listener.start()
+
 from telegram import Update
-from telegram.ext import Application, MessageHandler, filters, CommandHandler, ContextTypes, CallbackQueryHandler
-from config import BOT_TOKEN, ADMIN_IDS
-from database import db, initialize_db, User
-from adminhandlers import add_movie_handler, list_movies_handler, delete_movie_handler
+from telegram.ext import Application, MessageHandler, filters, CommandHandler, ContextTypes, CallbackQueryHandler, AIORateLimiter
+from config import BOT_TOKEN, ADMIN_IDS, PUBLIC_URL, WEBHOOK_SECRET, WEBHOOK_PORT, REQUIRED_CHANNELS
+from database import db, initialize_db, Movie, RequestLog, User, database_writer, flush_pending_writes, run_query, load_photo_file_ids
+from adminhandlers import ADMIN_FILTER, add_movie_handler, list_movies_handler, list_movies_page_handler, delete_movie_handler
 from userhandlers import handle_movie_request, search_movie, get_movie, get_movie_callback
-from forcejoin import require_membership, check_membership_callback, membership_status
+from forcejoin import require_membership, check_user_membership, check_membership_callback, membership_status, WELCOME_TEXT
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.constants import ParseMode
-import re
+from telegram.error import BadRequest, RetryAfter
+from utils import WELCOME_PHOTO_URL, send_cached_photo, photo_file_ids
+from cachetools import TTLCache
+from peewee import fn, Select, chunked
 
+try:
+    # Optional faster event loop; not available on Windows
+    import uvloop
+except ImportError:
+    uvloop = None
 
-# Enable logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
 logger = logging.getLogger(__name__)
 
 # Add this global variable for uptime tracking
-START_TIME = time.time()
+# Monotonic, so that wall-clock adjustments don't skew the uptime
+START_TIME = time.monotonic()
+
+# Units shown in the uptime, largest first
+UPTIME_UNITS = ((86400, "d"), (3600, "h"), (60, "m"), (1, "s"))
+
+# Uptime is reported in steps of this many seconds so the formatted string can be reused
+UPTIME_GRANULARITY = 30
+
+# Maximum number of broadcast messages in flight at once
+BROADCAST_CONCURRENCY = 25
+
+# Seconds between broadcast progress updates
+BROADCAST_PROGRESS_INTERVAL = 5
+
+# Periodic membership check timing, in seconds
+MEMBERSHIP_CHECK_INTERVAL = 86400
+MEMBERSHIP_CHECK_JITTER = 300
+
+# Number of users checked at once by the membership job, well under
+# forcejoin's own limit of 25 so that users checked by the handlers don't wait
+MEMBERSHIP_JOB_CONCURRENCY = 4
+
+# Channel lookups per second made by the membership job, leaving most of
+# Telegram's overall rate limit to the handlers
+MEMBERSHIP_JOB_LOOKUP_RATE = 5
+
+# Held while a membership check of all users runs, so only one runs at a time
+membership_check_lock = asyncio.Lock()
+
+# Users loaded per query by the membership job
+MEMBERSHIP_JOB_PAGE_SIZE = 500
+
+# Users saved per UPDATE statement by the membership job, keeping the
+# IN list under older SQLite variable limits
+MEMBERSHIP_JOB_BATCH_SIZE = 500
+
+# Maximum number of error replies in flight at once, so that a Telegram
+# outage doesn't turn every failed update into another pending request
+ERROR_REPLY_CONCURRENCY = 50
+error_reply_semaphore = asyncio.Semaphore(ERROR_REPLY_CONCURRENCY)
+ERROR_REPLY_TIMEOUT = 2  # Seconds
+
+# Seconds the /stat figures are reused before being queried again
+STATS_CACHE_TTL = 60
+TOP_MOVIES_CACHE_TTL = 300
+
+# Only fetch the update types the handlers below actually use
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
+
+# Seconds a getUpdates long poll waits for new updates before returning
+POLLING_TIMEOUT = 30
+
+# HTTP connections shared by all requests to Telegram, so that concurrent
+# handlers don't queue for the default pool of just one connection
+CONNECTION_POOL_SIZE = 256
+POOL_TIMEOUT = 10  # Seconds to wait for a free connection
+
+# /stat figures, keyed by whether they include the admin-only ones
+stats_cache = TTLCache(maxsize=2, ttl=STATS_CACHE_TTL)
+top_movies_cache = TTLCache(maxsize=1, ttl=TOP_MOVIES_CACHE_TTL)
+
+# Queries currently filling those caches, so concurrent misses share one
+inflight_queries = {}
+
+# Button definitions in broadcast text: [button:text:url]
+# The text stops at the first colon; the URL may contain colons but not "]"
+BUTTON_PATTERN = re.compile(r'\[button:([^:\]]+):([^\]]+)\]')
+
+# Media types a broadcast can carry, in the order they are looked for; each
+# is sent with the bot's send_<type> method
+BROADCAST_MEDIA_TYPES = ("photo", "video", "animation", "document", "audio", "voice")
+
+# Broadcast confirmation keyboard, built once and shared (PTB objects are immutable)
+BROADCAST_CONFIRM_BUTTON = InlineKeyboardButton("Yes ✅", callback_data="broadcast_confirm")
+BROADCAST_CANCEL_BUTTON = InlineKeyboardButton("No ❌", callback_data="broadcast_cancel")
+BROADCAST_CONFIRM_KEYBOARD = InlineKeyboardMarkup([[BROADCAST_CONFIRM_BUTTON, BROADCAST_CANCEL_BUTTON]])
+
+# Static message texts, built once at import
+HELP_TEXT: Final[str] = (
+    "🎬 *FlickFusion Help Guide* 🍿\n\n"
+    "*For Movie Lovers:*\n"
+    "• `/start` - See the welcome message\n"
+    "• `/search [movie title]` - Find movies by title\n"
+    "• `/get <title> [year]` - Get a specific movie\n"
+    "• `/get` - Get a random movie\n"
+    "• `/stat` - View bot statistics\n"
+    "• `/status` - Check your channel membership status\n"
+    "• Type a movie title to request it (e.g., `Inception (2010)`)\n"
+    "• `/help` - Show this help guide\n\n"
+    
+    "*For Admins:*\n"
+    "• `/addmovie [title]` - Add a new movie\n"
+    "• `/listmovies` - See all available movies\n"
+    "• `/deletemovie [id]` - Remove a movie\n"
+    "• `/broadcast` - Send message to all users\n"
+    "• `/checkmemberships` - Manually check user memberships\n"
+    "• `/stat` - View detailed bot statistics\n\n"
+    
+    "🎯 *Pro Tip:* For the best results when searching, include the movie's year if you know it!\n"
+    "Example: `/search Inception 2010`\n\n"
+    
+    "Need more help?\nContact @ViperROX or @Reyazsk "
+)
+
+BROADCAST_HELP_TEXT: Final[str] = (
+    "*🔊 Broadcast Command Help*\n\n"
+    "Use this command to send a message to all registered users.\n\n"
+    "*Usage:*\n"
+    "1. `/broadcast Your message here` - Send a text message\n"
+    "2. Reply to any message (text, photo, video, etc.) with `/broadcast` - Forward that content\n"
+    "3. Add media to your broadcast command - Send media with caption\n\n"
+    "To add buttons, use this format:\n"
+    "`/broadcast Your message [button:Join Channel:https://t.me/channel]`\n\n"
+    "*Note:* Broadcasting to many users may take time."
+)
+
+# Reply sent to the user when handling their update fails
+ERROR_TEXT: Final[str] = "Sorry, an error occurred while processing your request. Please try again later."
 
 @require_membership
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -31,157 +175,170 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Send welcome image with caption
     try:
-        await context.bot.send_photo(
+        # Reuses the photo's file ID after the first send instead of the URL
+        await send_cached_photo(
+            context.bot.send_photo,
+            WELCOME_PHOTO_URL,
             chat_id=chat_id,
-            photo="https://i.ibb.co/N6b3MVpj/1741892600514.jpg",
-            caption=(
-                "*🎬 Welcome to FlickFusion, Movie Lover! 🍿*\n\n"
-                "Hey there! I'm *FlickFusion*, your go-to bot for instant movie magic. 🪄 "
-                "Need a film? Just drop your request in the group, in this Format \"/search [Movie Name]\".\n\n"
-                "*Let's dive into the world of cinema. Sit back, grab popcorn, and enjoy! 🎥*\n\n"
-                "*Crafted with ❤️ by @ViperROX.*\n"
-                "Have questions? Just type /help or check your channel membership with /status!"
-            ),
-            parse_mode='Markdown'
+            caption=WELCOME_TEXT,
+            parse_mode=ParseMode.MARKDOWN
         )
         logger.info(f"Sent welcome message and image to chat ID: {chat_id}")
     except Exception as e:
         # Fallback to text-only message if image fails
         logger.error(f"Failed to send welcome image: {str(e)}")
-        await update.message.reply_text(
-            "*🎬 Welcome to FlickFusion, Movie Lover! 🍿*\n\n"
-            "Hey there! I'm *FlickFusion*, your go-to bot for instant movie magic. 🪄 "
-            "Need a film? Just drop your request in the group, in this Format \"/search [Movie Name]\".\n\n"
-            "*Let's dive into the world of cinema. Sit back, grab popcorn, and enjoy! 🎥*\n\n"
-            "*Crafted with ❤️ by @ViperROX.*\n"
-            "Have questions? Just type /help or check your channel membership with /status!",
-            parse_mode='Markdown'
-        )
+        await update.message.reply_text(WELCOME_TEXT, parse_mode=ParseMode.MARKDOWN)
 
 @require_membership
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send a styled help message when the command /help is issued."""
-    help_text = (
-        "🎬 *FlickFusion Help Guide* 🍿\n\n"
-        "*For Movie Lovers:*\n"
-        "• `/start` - See the welcome message\n"
-        "• `/search [movie title]` - Find movies by title\n"
-        "• `/get <title> [year]` - Get a specific movie\n"
-        "• `/get` - Get a random movie\n"
-        "• `/stat` - View bot statistics\n"
-        "• `/status` - Check your channel membership status\n"
-        "• Type a movie title to request it (e.g., `Inception (2010)`)\n"
-        "• `/help` - Show this help guide\n\n"
-        
-        "*For Admins:*\n"
-        "• `/addmovie [title]` - Add a new movie\n"
-        "• `/listmovies` - See all available movies\n"
-        "• `/deletemovie [id]` - Remove a movie\n"
-        "• `/broadcast` - Send message to all users\n"
-        "• `/checkmemberships` - Manually check user memberships\n"
-        "• `/stat` - View detailed bot statistics\n\n"
-        
-        "🎯 *Pro Tip:* For the best results when searching, include the movie's year if you know it!\n"
-        "Example: `/search Inception 2010`\n\n"
-        
-        "Need more help?\nContact @ViperROX or @Reyazsk "
-    )
-    
-    await update.message.reply_text(help_text, parse_mode='Markdown')
+    await update.message.reply_text(HELP_TEXT, parse_mode=ParseMode.MARKDOWN)
 
 async def check_all_memberships(context: ContextTypes.DEFAULT_TYPE):
     """Periodic job to check membership status of all users."""
-    from forcejoin import check_user_membership
-    from database import db, User
-    
+    async with membership_check_lock:
+        await run_membership_check(context)
+
+async def run_membership_check(context: ContextTypes.DEFAULT_TYPE):
+    """Check the membership of every user due for a recheck."""
     logger.info("Running periodic membership check")
     
     # Get all users who were last checked more than 24 hours ago
-    yesterday = datetime.datetime.now() - datetime.timedelta(days=1)
-    
-    # Check if connection is already open, and if not, open it
-    need_to_close = False
-    if db.is_closed():
-        db.connect()
-        need_to_close = True
+    # One timestamp serves the whole run; a few seconds' drift doesn't matter for a daily check
+    now = datetime.datetime.now()
+    yesterday = now - datetime.timedelta(days=1)
     
     try:
-        users = User.select().where(User.last_checked < yesterday)
-        
+        # Bounded, so that only about a page of users is held in memory at once
+        user_queue = asyncio.Queue(maxsize=MEMBERSHIP_JOB_PAGE_SIZE)
+        updated_users = []
         count = 0
-        for user in users:
-            try:
-                # Skip admins
-                if user.user_id in ADMIN_IDS:
-                    continue
+        
+        def save_users(users):
+            # Every user checked in this run shares the same timestamp, so only
+            # is_member differs: one plain UPDATE per value covers a whole batch
+            with db.atomic():
+                for is_member in (True, False):
+                    user_ids = [user.user_id for user in users if user.is_member == is_member]
+                    for batch in chunked(user_ids, MEMBERSHIP_JOB_BATCH_SIZE):
+                        (User
+                         .update(is_member=is_member, last_checked=now)
+                         .where(User.user_id.in_(batch))
+                         .execute())
+        
+        async def save_updates():
+            # Hand the buffered users over first, so that workers can keep adding to it meanwhile
+            users = updated_users[:]
+            updated_users.clear()
+            await run_query(save_users, users)
+        
+        async def check_users():
+            nonlocal count
+            
+            while True:
+                user = await user_queue.get()
+                try:
+                    # Check membership
+                    # Only the overall answer is needed here, so stop at the first missing channel
+                    results = await check_user_membership(user.user_id, context, force_refresh=True, early_exit=True)
                     
-                # Check membership
-                results = await check_user_membership(user.user_id, context)
-                is_member = results['is_member_of_all']
+                    # Update user status
+                    user.is_member = results['is_member_of_all']
+                    updated_users.append(user)
+                    
+                    count += 1
+                    if count % 10 == 0:  # Log progress every 10 users
+                        logger.info(f"Checked {count} users so far")
+                    
+                    if len(updated_users) >= MEMBERSHIP_JOB_BATCH_SIZE:
+                        await save_updates()
                 
-                # Update user status
-                user.is_member = is_member
-                user.last_checked = datetime.datetime.now()
-                user.save()
+                except Exception as e:
+                    logger.error(f"Error checking user {user.user_id}: {e}")
+                finally:
+                    user_queue.task_done()
+        
+        # Seconds between queuing users, pacing the job's lookups
+        queue_interval = len(REQUIRED_CHANNELS) / MEMBERSHIP_JOB_LOOKUP_RATE
+        
+        # Check the users concurrently as they are queued
+        workers = [asyncio.create_task(check_users()) for _ in range(MEMBERSHIP_JOB_CONCURRENCY)]
+        try:
+            # Page through the users by ID, loading each page off the event loop
+            last_user_id = None
+            while True:
+                # Admins are never checked, so leave them out of the query
+                query = User.select().where((User.last_checked < yesterday) & User.user_id.not_in(ADMIN_IDS))
+                if last_user_id is not None:
+                    query = query.where(User.user_id > last_user_id)
+                page = await run_query(list, query.order_by(User.user_id).limit(MEMBERSHIP_JOB_PAGE_SIZE))
                 
-                count += 1
-                if count % 10 == 0:  # Log progress every 10 users
-                    logger.info(f"Checked {count} users so far")
+                if not page:
+                    break
+                last_user_id = page[-1].user_id
                 
-            except Exception as e:
-                logger.error(f"Error checking user {user.user_id}: {e}")
+                for user in page:
+                    await user_queue.put(user)
+                    await asyncio.sleep(queue_interval)
+            
+            await user_queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        
+        if updated_users:
+            await save_updates()
         
         logger.info(f"Completed periodic membership check for {count} users")
     
     except Exception as e:
         logger.error(f"Error during periodic membership check: {e}")
-    finally:
-        # Only close the connection if we opened it
-        if need_to_close and not db.is_closed():
-            db.close()
+
+async def membership_check_loop(app):
+    """Run the periodic membership check roughly once a day."""
+    context = ContextTypes.DEFAULT_TYPE(application=app)
+    
+    # Start at a random point in the first day rather than straight after every
+    # restart; users stay due until they are checked, so none are skipped
+    await asyncio.sleep(random.uniform(MEMBERSHIP_CHECK_JITTER, MEMBERSHIP_CHECK_INTERVAL))
+    while True:
+        await check_all_memberships(context)
+        
+        # Jitter keeps several instances of the bot from checking all at once
+        await asyncio.sleep(MEMBERSHIP_CHECK_INTERVAL + random.uniform(-MEMBERSHIP_CHECK_JITTER, MEMBERSHIP_CHECK_JITTER))
 
 async def check_memberships_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Manual command to check all memberships (admin only)."""
-    user_id = update.effective_user.id
-    
-    # Only allow admins to run this command
-    if user_id not in ADMIN_IDS:
-        await update.message.reply_text("Sorry, only admins can use this command.")
+    if membership_check_lock.locked():
+        await update.message.reply_text("A membership check is already running. Please wait for it to finish.")
         return
     
-    await update.message.reply_text("Starting membership check for all users. This may take some time...")
-    
-    # Run the check
-    await check_all_memberships(context)
-    
-    await update.message.reply_text("Membership check completed!")
+    # Taken before the first await, so a second /checkmemberships sent meanwhile is turned away
+    async with membership_check_lock:
+        await update.message.reply_text("Starting membership check for all users. This may take some time...")
+        
+        # Run the check
+        await run_membership_check(context)
+        
+        await update.message.reply_text("Membership check completed!")
+
+def load_user_ids() -> array:
+    """Load the IDs of all registered users."""
+    # Read only the IDs straight from the database cursor, skipping peewee's row conversion
+    cursor = db.execute(User.select(User.user_id))
+    # Packed as 64-bit integers, which take a fraction of the memory of a list
+    # while the IDs wait in user_data for the admin's confirmation
+    return array('q', (row[0] for row in cursor))
 
 async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     Command to broadcast a message to all users.
     Only admins can use this command.
     """
-    user_id = update.effective_user.id
-    
-    # Check if user is an admin
-    if user_id not in ADMIN_IDS:
-        await update.message.reply_text("Sorry, only admins can use this command.")
-        return
-    
     # Check if the command has arguments or is replying to a message
     if not context.args and not update.message.reply_to_message:
-        await update.message.reply_text(
-            "*🔊 Broadcast Command Help*\n\n"
-            "Use this command to send a message to all registered users.\n\n"
-            "*Usage:*\n"
-            "1. `/broadcast Your message here` - Send a text message\n"
-            "2. Reply to any message (text, photo, video, etc.) with `/broadcast` - Forward that content\n"
-            "3. Add media to your broadcast command - Send media with caption\n\n"
-            "To add buttons, use this format:\n"
-            "`/broadcast Your message [button:Join Channel:https://t.me/channel]`\n\n"
-            "*Note:* Broadcasting to many users may take time.",
-            parse_mode=ParseMode.MARKDOWN
-        )
+        await update.message.reply_text(BROADCAST_HELP_TEXT, parse_mode=ParseMode.MARKDOWN)
         return
     
     # Start the broadcast process
@@ -189,36 +346,26 @@ async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Get all users from the database
     try:
-        # Connect to database if needed
-        need_to_close = False
-        if db.is_closed():
-            db.connect()
-            need_to_close = True
-        
-        users = User.select(User.user_id)
-        total_users = users.count()
+        user_ids = await run_query(load_user_ids)
+        total_users = len(user_ids)
         
         # Confirm with the admin before proceeding
         confirm_message = await update.message.reply_text(
             f"You are about to broadcast to {total_users} users. Proceed?",
-            reply_markup=InlineKeyboardMarkup([
-                [
-                    InlineKeyboardButton("Yes ✅", callback_data="broadcast_confirm"),
-                    InlineKeyboardButton("No ❌", callback_data="broadcast_cancel")
-                ]
-            ])
+            reply_markup=BROADCAST_CONFIRM_KEYBOARD
         )
         
         # Store the necessary info in user_data for the callback
         context.user_data["broadcast_info"] = {
-            "users": [user.user_id for user in users],
+            "users": user_ids,
             "confirm_message_id": confirm_message.message_id,
             "chat_id": update.effective_chat.id,
         }
         
         # Store the message to broadcast
         if update.message.reply_to_message:
-            context.user_data["broadcast_info"]["reply_message"] = update.message.reply_to_message
+            # Only the message ID is needed, since the message is copied server-side
+            context.user_data["broadcast_info"]["reply_message_id"] = update.message.reply_to_message.message_id
         else:
             # Process message text for buttons
             message_text = " ".join(context.args)
@@ -227,15 +374,14 @@ async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             # Extract button data from the message - format: [button:text:url]
             if "[button:" in message_text:
                 # Find all button definitions
-                button_pattern = r'\[button:(.*?):(.*?)\]'
-                button_matches = re.findall(button_pattern, message_text)
+                button_matches = BUTTON_PATTERN.findall(message_text)
                 
                 # Create buttons and clean message text
                 for button_text, button_url in button_matches:
                     buttons.append([InlineKeyboardButton(button_text, url=button_url)])
                 
                 # Remove button definitions from the message
-                message_text = re.sub(button_pattern, '', message_text).strip()
+                message_text = BUTTON_PATTERN.sub('', message_text).strip()
             
             context.user_data["broadcast_info"]["text"] = message_text
             
@@ -244,201 +390,127 @@ async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 context.user_data["broadcast_info"]["buttons"] = buttons
             
             # Store media if attached
-            if update.message.photo:
-                context.user_data["broadcast_info"]["photo"] = update.message.photo[-1].file_id
-            elif update.message.video:
-                context.user_data["broadcast_info"]["video"] = update.message.video.file_id
-            elif update.message.animation:
-                context.user_data["broadcast_info"]["animation"] = update.message.animation.file_id
-            elif update.message.document:
-                context.user_data["broadcast_info"]["document"] = update.message.document.file_id
-            elif update.message.audio:
-                context.user_data["broadcast_info"]["audio"] = update.message.audio.file_id
-            elif update.message.voice:
-                context.user_data["broadcast_info"]["voice"] = update.message.voice.file_id
+            for media_type in BROADCAST_MEDIA_TYPES:
+                media = getattr(update.message, media_type)
+                if media:
+                    # Photos come in several sizes; use the largest
+                    file_id = media[-1].file_id if media_type == "photo" else media.file_id
+                    context.user_data["broadcast_info"]["media"] = (media_type, file_id)
+                    break
         
     except Exception as e:
         logger.error(f"Error preparing broadcast: {str(e)}")
         await update.message.reply_text(f"Error preparing broadcast: {str(e)}")
-    finally:
-        # Close the database connection if we opened it
-        if need_to_close and not db.is_closed():
-            db.close()
 
-async def broadcast_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle the broadcast confirmation callback."""
-    query = update.callback_query
-    await query.answer()
+async def prepare_broadcast(bot, broadcast_info: dict):
+    """
+    Stage a broadcast once so that every recipient gets a server-side copy of it.
     
-    # Get the broadcast info from user_data
-    broadcast_info = context.user_data.get("broadcast_info", {})
+    The replied message is used as-is; a composed message is first posted to the
+    admin's chat. Either way recipients receive it through copy_message, so
+    no text, caption or media reference has to be resent per user.
     
-    if not broadcast_info:
-        await query.edit_message_text("Broadcast information not found. Please try again.")
-        return
+    Returns:
+        dict: copy_message keyword arguments shared by every recipient
+    """
+    chat_id = broadcast_info["chat_id"]
     
-    if query.data == "broadcast_cancel":
-        await query.edit_message_text("Broadcast cancelled.")
-        return
+    if "reply_message_id" in broadcast_info:
+        # Copy the replied message, keeping its original formatting
+        return {"from_chat_id": chat_id, "message_id": broadcast_info["reply_message_id"]}
     
-    # Start the broadcast
-    await query.edit_message_text("Broadcasting messages... This may take some time.")
+    # Compose the message once in the admin's chat
+    message_text = broadcast_info.get("text", "")
+    keyboard = None
+    
+    # Add buttons if specified
+    if "buttons" in broadcast_info:
+        keyboard = InlineKeyboardMarkup(broadcast_info["buttons"])
+    
+    kwargs = {"caption": message_text, "reply_markup": keyboard, "parse_mode": ParseMode.MARKDOWN}
+    
+    # Send media if attached, with the matching send_<type> method
+    if "media" in broadcast_info:
+        media_type, file_id = broadcast_info["media"]
+        send_media = getattr(bot, f"send_{media_type}")
+        source = await send_media(chat_id, **{media_type: file_id}, **kwargs)
+    else:
+        # Just text
+        source = await bot.send_message(chat_id, text=message_text, reply_markup=keyboard, parse_mode=ParseMode.MARKDOWN)
     
+    # Copies don't carry the inline keyboard over, so pass it along explicitly
+    return {"from_chat_id": chat_id, "message_id": source.message_id, "reply_markup": keyboard}
+
+async def send_broadcast(bot, broadcast_info: dict):
+    """Send a confirmed broadcast to all its recipients and report the results."""
     users = broadcast_info.get("users", [])
-    successful = 0
-    failed = 0
+    
+    # Stage the message once and copy it to every recipient; this is where
+    # Telegram rejects a bad message, so do it before reporting any progress
+    try:
+        copy_kwargs = await prepare_broadcast(bot, broadcast_info)
+    except Exception as e:
+        logger.error(f"Error preparing broadcast: {str(e)}")
+        await bot.send_message(chat_id=broadcast_info["chat_id"], text=f"Error preparing broadcast: {str(e)}")
+        return
     
     # Set up progress reporting
     total = len(users)
-    progress_message = await context.bot.send_message(
+    progress_message = await bot.send_message(
         chat_id=broadcast_info["chat_id"],
         text=f"Broadcasting: 0/{total} completed (0%)"
     )
-    last_update_time = time.time()
+    completed = 0
+    successful = 0
     
-    # Process each user
-    for i, user_id in enumerate(users):
-        try:
-            # Update progress message every 20 users or 5 seconds
-            current_time = time.time()
-            if i % 20 == 0 or current_time - last_update_time >= 5:
-                progress_percent = round((i / total) * 100)
-                await context.bot.edit_message_text(
+    # Shared by the workers below, each taking the next recipient when it is free
+    recipients = iter(users)
+    
+    async def send_to_recipients():
+        nonlocal completed, successful
+        
+        # Pacing is left to the application's rate limiter
+        for user_id in recipients:
+            try:
+                await bot.copy_message(chat_id=user_id, **copy_kwargs)
+                successful += 1
+            except Exception as e:
+                logger.error(f"Failed to send broadcast to user {user_id}: {str(e)}")
+            completed += 1
+    
+    async def report_progress():
+        # Report on a timer so that the sends never wait on progress updates
+        reported = 0
+        while True:
+            await asyncio.sleep(BROADCAST_PROGRESS_INTERVAL)
+            if completed == reported:
+                continue
+            reported = completed
+            
+            progress_percent = round((reported / total) * 100)
+            logger.info(f"Broadcast progress: {reported}/{total} completed")
+            try:
+                await bot.edit_message_text(
                     chat_id=broadcast_info["chat_id"],
                     message_id=progress_message.message_id,
-                    text=f"Broadcasting: {i}/{total} completed ({progress_percent}%)"
+                    text=f"Broadcasting: {reported}/{total} completed ({progress_percent}%)"
                 )
-                last_update_time = current_time
-            
-            # Send the appropriate message type
-            if "reply_message" in broadcast_info:
-                # Forward the replied message
-                reply_msg = broadcast_info["reply_message"]
-                
-                if reply_msg.photo:
-                    await context.bot.send_photo(
-                        chat_id=user_id,
-                        photo=reply_msg.photo[-1].file_id,
-                        caption=reply_msg.caption,
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-                elif reply_msg.video:
-                    await context.bot.send_video(
-                        chat_id=user_id,
-                        video=reply_msg.video.file_id,
-                        caption=reply_msg.caption,
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-                elif reply_msg.animation:
-                    await context.bot.send_animation(
-                        chat_id=user_id,
-                        animation=reply_msg.animation.file_id,
-                        caption=reply_msg.caption,
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-                elif reply_msg.document:
-                    await context.bot.send_document(
-                        chat_id=user_id,
-                        document=reply_msg.document.file_id,
-                        caption=reply_msg.caption,
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-                elif reply_msg.audio:
-                    await context.bot.send_audio(
-                        chat_id=user_id,
-                        audio=reply_msg.audio.file_id,
-                        caption=reply_msg.caption,
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-                elif reply_msg.voice:
-                    await context.bot.send_voice(
-                        chat_id=user_id,
-                        voice=reply_msg.voice.file_id,
-                        caption=reply_msg.caption,
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-                else:
-                    # Text message
-                    await context.bot.send_message(
-                        chat_id=user_id,
-                        text=reply_msg.text or "Empty message",
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-            else:
-                # Send the composed message
-                message_text = broadcast_info.get("text", "")
-                keyboard = None
-                
-                # Add buttons if specified
-                if "buttons" in broadcast_info:
-                    keyboard = InlineKeyboardMarkup(broadcast_info["buttons"])
-                
-                # Send media if attached
-                if "photo" in broadcast_info:
-                    await context.bot.send_photo(
-                        chat_id=user_id,
-                        photo=broadcast_info["photo"],
-                        caption=message_text,
-                        reply_markup=keyboard,
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-                elif "video" in broadcast_info:
-                    await context.bot.send_video(
-                        chat_id=user_id,
-                        video=broadcast_info["video"],
-                        caption=message_text,
-                        reply_markup=keyboard,
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-                elif "animation" in broadcast_info:
-                    await context.bot.send_animation(
-                        chat_id=user_id,
-                        animation=broadcast_info["animation"],
-                        caption=message_text,
-                        reply_markup=keyboard,
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-                elif "document" in broadcast_info:
-                    await context.bot.send_document(
-                        chat_id=user_id,
-                        document=broadcast_info["document"],
-                        caption=message_text,
-                        reply_markup=keyboard,
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-                elif "audio" in broadcast_info:
-                    await context.bot.send_audio(
-                        chat_id=user_id,
-                        audio=broadcast_info["audio"],
-                        caption=message_text,
-                        reply_markup=keyboard,
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-                elif "voice" in broadcast_info:
-                    await context.bot.send_voice(
-                        chat_id=user_id,
-                        voice=broadcast_info["voice"],
-                        caption=message_text,
-                        reply_markup=keyboard,
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-                else:
-                    # Just text
-                    await context.bot.send_message(
-                        chat_id=user_id,
-                        text=message_text,
-                        reply_markup=keyboard,
-                        parse_mode=ParseMode.MARKDOWN
-                    )
-                
-            successful += 1
-            
-            # Add a small delay to avoid hitting Telegram's rate limits
-            await asyncio.sleep(0.05)
-            
-        except Exception as e:
-            logger.error(f"Failed to send broadcast to user {user_id}: {str(e)}")
-            failed += 1
+            except BadRequest as e:
+                # Nothing to change, e.g. when a retried edit already went through
+                if "not modified" not in str(e).lower():
+                    logger.warning(f"Failed to update broadcast progress: {str(e)}")
+            except Exception as e:
+                logger.warning(f"Failed to update broadcast progress: {str(e)}")
+    
+    # A fixed pool of workers sends to all users, so only BROADCAST_CONCURRENCY
+    # tasks exist however many recipients there are
+    reporter = asyncio.create_task(report_progress())
+    try:
+        await asyncio.gather(*(send_to_recipients() for _ in range(BROADCAST_CONCURRENCY)))
+    finally:
+        reporter.cancel()
+    
+    failed = total - successful
     
     # Final report
     completion_message = (
@@ -449,79 +521,160 @@ async def broadcast_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
         f"Completion rate: {round((successful/total)*100)}%"
     )
     
-    await context.bot.edit_message_text(
+    await bot.edit_message_text(
         chat_id=broadcast_info["chat_id"],
         message_id=progress_message.message_id,
         text=completion_message,
         parse_mode=ParseMode.MARKDOWN
     )
+
+async def broadcast_worker(broadcast_queue: asyncio.Queue, bot):
+    """Run queued broadcasts one at a time, away from the update handlers."""
+    while True:
+        broadcast_info = await broadcast_queue.get()
+        try:
+            await send_broadcast(bot, broadcast_info)
+        except Exception as e:
+            logger.error(f"Error sending broadcast: {str(e)}")
+        finally:
+            broadcast_queue.task_done()
+
+async def broadcast_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle the broadcast confirmation callback."""
+    query = update.callback_query
+    await query.answer()
+    
+    # Get the broadcast info from user_data
+    broadcast_info = context.user_data.get("broadcast_info", {})
+    
+    if not broadcast_info:
+        await query.edit_message_text("Broadcast information not found. Please try again.")
+        return
+    
+    if query.data == "broadcast_cancel":
+        await query.edit_message_text("Broadcast cancelled.")
+        return
+    
+    # Start the broadcast
+    await query.edit_message_text("Broadcasting messages... This may take some time.")
+    
+    # Hand the broadcast over to the background worker so that
+    # other updates keep being processed while it runs
+    del context.user_data["broadcast_info"]
+    context.application.bot_data["broadcast_queue"].put_nowait(broadcast_info)
+
+def query_stats(is_admin: bool) -> dict:
+    """
+    Query the figures shown by /stat.
     
-    # Clear the broadcast info from user_data
-    if "broadcast_info" in context.user_data:
-        del context.user_data["broadcast_info"]
+    Args:
+        is_admin: Whether to include the admin-only figures
+        
+    Returns:
+        dict: The counts, including the admin-only ones if requested
+    """
+    # Basic statistics everyone can see
+    counts = [
+        Movie.select(fn.COUNT(Movie.id)).alias('total_movies'),
+        RequestLog.select(fn.COUNT(RequestLog.id)).alias('total_requests'),
+        User.select(fn.COUNT(User.user_id)).alias('total_users'),
+    ]
+    if is_admin:
+        # Calculate active users in the last 30 days
+        thirty_days_ago = datetime.datetime.now() - datetime.timedelta(days=30)
+        counts.append(RequestLog
+                      .select(fn.COUNT(fn.DISTINCT(RequestLog.user_id)))
+                      .where(RequestLog.request_time > thirty_days_ago)
+                      .alias('active_users'))
+        
+        # Get user membership statistics
+        counts.append(User
+                      .select(fn.COUNT(User.user_id))
+                      .where(User.is_member == True)
+                      .alias('member_users'))
+    
+    # Fetch every count in a single query, one subquery per count
+    return Select(columns=counts).bind(db).dicts().get()
 
+def query_top_movies() -> list:
+    """Query the 5 most requested movies, with their request counts."""
+    # Materialized once, so no separate count query is needed to check for any;
+    # only the shown columns are read, as plain tuples rather than Movie rows
+    return list(Movie
+                .select(Movie.title, Movie.year, fn.COUNT(RequestLog.id).alias('request_count'))
+                .join(RequestLog)
+                .group_by(Movie.id)
+                .order_by(fn.COUNT(RequestLog.id).desc())
+                .limit(5)
+                .namedtuples())
+
+async def cached_query(cache: TTLCache, key, func, *args):
+    """
+    Return cache[key], running func(*args) in a worker thread to fill it on a miss.
+    
+    Concurrent misses for the same key share one query rather than each running their own.
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+    
+    # Shielded so that one caller giving up doesn't cancel the query for the others
+    inflight = inflight_queries.get((func, key))
+    if inflight is not None:
+        return await asyncio.shield(inflight)
+    
+    async def load():
+        # Queried in a worker thread, so the event loop keeps serving other updates
+        value = await run_query(func, *args)
+        cache[key] = value
+        return value
+    
+    query = asyncio.ensure_future(load())
+    inflight_queries[(func, key)] = query
+    query.add_done_callback(lambda _: inflight_queries.pop((func, key), None))
+    return await asyncio.shield(query)
+
+async def get_stats(is_admin: bool) -> dict:
+    """Get the /stat figures, reusing them for STATS_CACHE_TTL seconds."""
+    return await cached_query(stats_cache, is_admin, query_stats, is_admin)
+
+async def get_top_movies() -> list:
+    """Get the most requested movies, reusing them for TOP_MOVIES_CACHE_TTL seconds."""
+    # Grouping every request log is the costliest query, and the ranking changes slowly
+    return await cached_query(top_movies_cache, "top_movies", query_top_movies)
 
 @require_membership
 async def stat_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Display bot statistics with different views for admins and regular users."""
-    from database import db, Movie, RequestLog, User
-    from peewee import fn
-    import datetime
-    
     # Check if this is an admin request (for detailed stats)
     user_id = update.effective_user.id
     is_admin = user_id in ADMIN_IDS
     
     try:
-        # Ensure database connection is open
-        need_to_close = False
-        if db.is_closed():
-            db.connect()
-            need_to_close = True
-            
-        # Basic statistics everyone can see
-        total_movies = Movie.select().count()
-        total_requests = RequestLog.select().count()
-        total_users = User.select().count()
+        stats = await get_stats(is_admin)
         
         # Create statistics message
         stats_message = [
             "📊 *FlickFusion Bot Statistics* 📊\n",
-            f"🎬 *Total Movies:* {total_movies}",
-            f"🔍 *Total Requests:* {total_requests}",
-            f"👥 *Registered Users:* {total_users}"
+            f"🎬 *Total Movies:* {stats['total_movies']}",
+            f"🔍 *Total Requests:* {stats['total_requests']}",
+            f"👥 *Registered Users:* {stats['total_users']}"
         ]
         
         # Add more detailed statistics for admins
         if is_admin:
-            # Calculate active users in the last 30 days
-            thirty_days_ago = datetime.datetime.now() - datetime.timedelta(days=30)
-            active_users = (RequestLog
-                          .select(RequestLog.user_id)
-                          .distinct()
-                          .where(RequestLog.request_time > thirty_days_ago)
-                          .count())
-            
-            # Get the top 5 most requested movies
-            top_movies = (Movie
-                          .select(Movie, fn.COUNT(RequestLog.id).alias('request_count'))
-                          .join(RequestLog)
-                          .group_by(Movie.id)
-                          .order_by(fn.COUNT(RequestLog.id).desc())
-                          .limit(5))
-            
-            # Get user membership statistics
-            member_users = User.select().where(User.is_member == True).count()
-            non_member_users = total_users - member_users
+            member_users = stats['member_users']
+            non_member_users = stats['total_users'] - member_users
             
             # Add admin statistics to the message
             stats_message.append("\n*Admin Statistics:*")
-            stats_message.append(f"👤 *Active Users (30 days):* {active_users}")
+            stats_message.append(f"👤 *Active Users (30 days):* {stats['active_users']}")
             stats_message.append(f"✅ *Users in Channels:* {member_users}")
             stats_message.append(f"❌ *Users Not in Channels:* {non_member_users}")
             
             # Add top movies section
-            if top_movies.count() > 0:
+            top_movies = await get_top_movies()
+            if top_movies:
                 stats_message.append("\n*Top Requested Movies:*")
                 for i, movie in enumerate(top_movies, 1):
                     year_str = f" ({movie.year})" if movie.year else ""
@@ -534,7 +687,7 @@ async def stat_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Send the statistics message
         await update.message.reply_text(
             "\n".join(stats_message),
-            parse_mode='Markdown'
+            parse_mode=ParseMode.MARKDOWN
         )
         
     except Exception as e:
@@ -542,29 +695,26 @@ async def stat_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(
             "Sorry, an error occurred while generating statistics. Please try again later."
         )
-    finally:
-        # Only close the connection if we opened it
-        if need_to_close and not db.is_closed():
-            db.close()
 
 # Helper function for uptime calculation
 def get_uptime():
     """Get the bot's uptime in a human-readable format."""
-    uptime_seconds = int(time.time() - START_TIME)
-    
-    days, remainder = divmod(uptime_seconds, 86400)
-    hours, remainder = divmod(remainder, 3600)
-    minutes, seconds = divmod(remainder, 60)
-    
+    uptime = int(time.monotonic() - START_TIME)
+    return format_uptime(uptime - uptime % UPTIME_GRANULARITY)
+
+@lru_cache(maxsize=1)
+def format_uptime(remainder):
+    """Format a number of seconds as e.g. '1d 2h 30m'."""
+    # Under a minute there is nothing to break down
+    if remainder < 60:
+        return f"{remainder}s"
+    
+    # Leave out the units that are zero
     parts = []
-    if days > 0:
-        parts.append(f"{days}d")
-    if hours > 0:
-        parts.append(f"{hours}h")
-    if minutes > 0:
-        parts.append(f"{minutes}m")
-    if seconds > 0 or not parts:
-        parts.append(f"{seconds}s")
+    for unit_seconds, suffix in UPTIME_UNITS:
+        value, remainder = divmod(remainder, unit_seconds)
+        if value:
+            parts.append(f"{value}{suffix}")
     
     return " ".join(parts)
 
@@ -575,78 +725,175 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
     
     # Send a message to the user if it's a user-initiated update
     if update and hasattr(update, 'effective_chat') and update.effective_chat:
+        # Reply in the background, so the error handler doesn't also wait on Telegram
+        context.application.create_task(send_error_reply(context.bot, update.effective_chat.id))
+
+async def send_error_reply(bot, chat_id: int):
+    """Tell a user that handling their update failed."""
+    async with error_reply_semaphore:
         try:
-            await context.bot.send_message(
-                chat_id=update.effective_chat.id,
-                text="Sorry, an error occurred while processing your request. Please try again later."
+            await bot.send_message(
+                chat_id=chat_id,
+                text=ERROR_TEXT,
+                connect_timeout=ERROR_REPLY_TIMEOUT,
+                read_timeout=ERROR_REPLY_TIMEOUT
             )
         except Exception as e:
             logger.error(f"Failed to send error message to user: {str(e)}")
 
 
 
-# Async function for post_init
-async def initialize_job_queue(app):
-    """Async function for post_init that returns None but satisfies the awaitable requirement."""
-    return None
+async def post_init(app):
+    """Start the background tasks once the application is initialized."""
+    # A single worker keeps concurrent broadcasts from sharing Telegram's rate limit
+    app.bot_data["broadcast_queue"] = asyncio.Queue()
+    app.bot_data["background_tasks"] = [
+        asyncio.create_task(broadcast_worker(app.bot_data["broadcast_queue"], app.bot)),
+        asyncio.create_task(database_writer()),
+        asyncio.create_task(membership_check_loop(app)),
+    ]
+    logger.info("Scheduled periodic membership checks every 24 hours")
+
+async def post_stop(app):
+    """Cancel the background tasks when the application stops."""
+    tasks = app.bot_data.get("background_tasks", [])
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    
+    # Write out anything still waiting for the next batch
+    flush_pending_writes()
+
+# API methods that post a message to a chat; Telegram's per-group limit only counts these
+GROUP_LIMITED_METHODS = ("send", "copyMessage", "forwardMessage")
+
+class SendRateLimiter(AIORateLimiter):
+    """AIORateLimiter that applies the per-group limit to sent messages only.
+    
+    AIORateLimiter treats every negative chat_id as a group, so lookups such as
+    getChatMember against a required channel would otherwise share that
+    channel's 20-per-minute bucket.
+    """
+    
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        if endpoint.startswith(GROUP_LIMITED_METHODS):
+            return await super().process_request(callback, args, kwargs, endpoint, data, rate_limit_args)
+        
+        # Same as AIORateLimiter.process_request, but never picking a group bucket;
+        # calls to a chat still count against the overall limit
+        max_retries = rate_limit_args or self._max_retries
+        chat = data.get("chat_id") is not None
+        for i in range(max_retries + 1):
+            try:
+                return await self._run_request(chat=chat, group=False, callback=callback, args=args, kwargs=kwargs)
+            except RetryAfter as e:
+                if i == max_retries:
+                    logger.error(f"Rate limit hit after {max_retries} retries calling {endpoint}")
+                    raise
+                
+                # Hold back every other request until Telegram's wait is over
+                self._retry_after_event.clear()
+                await asyncio.sleep(e.retry_after + 0.1)
+            finally:
+                self._retry_after_event.set()
 
 def main():
     """Start the bot."""
     # Initialize database
     initialize_db()
     
+    # Reuse the file IDs of photos sent before the last restart
+    photo_file_ids.update(load_photo_file_ids())
+    
+    # Run the application on uvloop when it's installed
+    if uvloop is not None:
+        uvloop.install()
+        logger.info("Using uvloop event loop")
+    
     try:
-        # Create the Application with explicit JobQueue initialization using an async function
-        application = Application.builder().token(BOT_TOKEN).post_init(initialize_job_queue).build()
+        # Queue outgoing requests within Telegram's global and per-group limits
+        rate_limiter = SendRateLimiter(
+            overall_max_rate=30,
+            overall_time_period=1,
+            group_max_rate=20,
+            group_time_period=60,
+            max_retries=3
+        )
+        
+        # Create the Application, starting and stopping the background tasks with it.
+        # Updates are dispatched one at a time, as the add-movie ConversationHandler
+        # requires; the other handlers are registered with block=False, so slow ones
+        # still run side by side instead of holding up the next update
+        application = (
+            Application.builder()
+            .token(BOT_TOKEN)
+            .rate_limiter(rate_limiter)
+            .connection_pool_size(CONNECTION_POOL_SIZE)
+            .pool_timeout(POOL_TIMEOUT)
+            .post_init(post_init)
+            .post_stop(post_stop)
+            .build()
+        )
         
         # Register the error handler
         application.add_error_handler(error_handler)
         
         # Add handlers
-        application.add_handler(CommandHandler("start", start))
-        application.add_handler(CommandHandler("help", help_command))
-        application.add_handler(CommandHandler("search", search_movie))
-        application.add_handler(CommandHandler("get", get_movie))
-        application.add_handler(CommandHandler("status", membership_status))
-        application.add_handler(CommandHandler("stat", stat_command))
-        application.add_handler(CommandHandler("checkmemberships", check_memberships_command))
+        application.add_handler(CommandHandler("start", start, block=False))
+        application.add_handler(CommandHandler("help", help_command, block=False))
+        application.add_handler(CommandHandler("search", search_movie, block=False))
+        application.add_handler(CommandHandler("get", get_movie, block=False))
+        application.add_handler(CommandHandler("status", membership_status, block=False))
+        application.add_handler(CommandHandler("stat", stat_command, block=False))
+        application.add_handler(CommandHandler("checkmemberships", check_memberships_command, filters=ADMIN_FILTER, block=False))
         
         # Add broadcast handlers
-        application.add_handler(CommandHandler("broadcast", broadcast_command))
-        application.add_handler(CallbackQueryHandler(broadcast_callback, pattern=r'^broadcast_'))
+        application.add_handler(CommandHandler("broadcast", broadcast_command, filters=ADMIN_FILTER, block=False))
+        application.add_handler(CallbackQueryHandler(broadcast_callback, pattern=r'^broadcast_', block=False))
         
         # Add callback handlers
-        application.add_handler(CallbackQueryHandler(get_movie_callback, pattern=r'^get_movie_'))
-        application.add_handler(CallbackQueryHandler(check_membership_callback, pattern=r'^check_membership$'))
+        application.add_handler(CallbackQueryHandler(get_movie_callback, pattern=r'^get_movie_', block=False))
+        application.add_handler(CallbackQueryHandler(check_membership_callback, pattern=r'^check_membership$', block=False))
         
-        # Admin handlers
+        # Admin handlers; the conversation blocks, so each step sees the state left by the one before
         application.add_handler(add_movie_handler)
         application.add_handler(list_movies_handler)
+        application.add_handler(list_movies_page_handler)
         application.add_handler(delete_movie_handler)
         
-        # Set up periodic membership check with proper error handling
-        if hasattr(application, 'job_queue') and application.job_queue is not None:
-            application.job_queue.run_repeating(check_all_memberships, interval=86400, first=10)
-            logger.info("Scheduled periodic membership checks every 24 hours")
-        else:
-            logger.warning("JobQueue not available. Periodic membership checks will not run automatically.")
-            logger.info("Added /checkmemberships command for manual membership verification")
-        
         # User movie request handler - should be last to catch all messages
         application.add_handler(MessageHandler(
-            filters.TEXT & ~filters.COMMAND, handle_movie_request
+            filters.TEXT & ~filters.COMMAND, handle_movie_request, block=False
         ))
         
         # Start the Bot
-        logger.info("Starting FlickFusion bot")
-        application.run_polling()
+        if PUBLIC_URL and os.getenv("ENV") != "dev":
+            # Let Telegram push updates instead of polling getUpdates for them
+            logger.info(f"Starting FlickFusion bot with webhook on port {WEBHOOK_PORT}")
+            application.run_webhook(
+                listen="0.0.0.0",
+                port=WEBHOOK_PORT,
+                url_path=BOT_TOKEN,
+                webhook_url=f"{PUBLIC_URL}/{BOT_TOKEN}",
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=ALLOWED_UPDATES
+            )
+        else:
+            logger.info("Starting FlickFusion bot with long polling")
+            application.run_polling(
+                poll_interval=0.0,
+                timeout=POLLING_TIMEOUT,
+                allowed_updates=ALLOWED_UPDATES
+            )
         
     except Exception as e:
         logger.error(f"Error starting bot: {e}")
     finally:
-        # Close the database connection when done
-        if not db.is_closed():
-            db.close()
+        # Close the pooled connections when done
+        db.close_all()
+        
+        # Write out any log messages still queued
+        log_listener.stop()
 
 if __name__ == '__main__':
     main()
@@ -1,8 +1,9 @@
 import random
 import logging
-from telegram import Update
+from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes
-from database import Movie, RequestLog
+from telegram.constants import ParseMode
+from database import db, Movie, log_request, get_movie_by_id, find_movie_by_title
 from utils import parse_movie_title, is_authorized_group, format_movie_info
 from config import CHANNEL_ID, AUTH_GROUPS
 from peewee import DoesNotExist
@@ -21,47 +22,32 @@ async def handle_movie_request(update: Update, context: ContextTypes.DEFAULT_TYP
     # Parse the movie title and year
     title, year = parse_movie_title(update.message.text)
     
-    try:
-        # Ensure database connection is open
-        if db.is_closed():
-            db.connect()
-            
-        # Try to find the movie in the database
-        query = Movie.select()
-        
-        # If we have a year, use it for more precise matching
-        if year:
-            movie = query.where(
-                (Movie.title.contains(title)) & (Movie.year == year)
-            ).get()
-        else:
-            # Otherwise just search by title
-            movie = query.where(Movie.title.contains(title)).get()
-        
-        # Forward the movie from the channel
-        await context.bot.forward_message(
-            chat_id=update.effective_chat.id,
-            from_chat_id=CHANNEL_ID,
-            message_id=movie.message_id
-        )
-        
-        # Log the request
-        RequestLog.create(
-            user_id=update.effective_user.id,
-            movie_id=movie.id,
-            group_id=update.effective_chat.id
-        )
-        
-    except DoesNotExist:
+    # Try to find the movie, matching on the year too when one was given
+    # The pooled connection is returned as soon as the lookup is done
+    with db.connection_context():
+        movie = find_movie_by_title(title, year)
+    
+    if movie is None:
         # If the movie wasn't found, let the user know
         await update.message.reply_text(
             f"Sorry, I couldn't find the movie '{title}'" + (f" ({year})" if year else "") + 
             " in my database. Please check the title or try another movie."
         )
-    finally:
-        # Close the database connection to prevent connection leaks
-        if not db.is_closed():
-            db.close()
+        return
+    
+    # Forward the movie from the channel
+    await context.bot.forward_message(
+        chat_id=update.effective_chat.id,
+        from_chat_id=CHANNEL_ID,
+        message_id=movie.message_id
+    )
+    
+    # Log the request
+    log_request(
+        user_id=update.effective_user.id,
+        movie_id=movie.id,
+        group_id=update.effective_chat.id
+    )
 
 async def get_movie(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /get command to request a movie by title or get a random movie."""
@@ -79,22 +65,24 @@ async def get_movie(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not context.args:
         # No arguments - get a random movie
         try:
-            # Count total movies
-            total_movies = Movie.select().count()
+            with db.connection_context():
+                # Count total movies
+                total_movies = Movie.select().count()
+                
+                # Get a random movie
+                if total_movies > 0:
+                    random_index = random.randint(0, total_movies - 1)
+                    movie = Movie.select().limit(1).offset(random_index).get()
             
             if total_movies == 0:
                 await update.message.reply_text("No movies in the database yet.")
                 return
-                
-            # Get a random movie
-            random_index = random.randint(0, total_movies - 1)
-            movie = Movie.select().limit(1).offset(random_index).get()
             
             await update.message.reply_text(
                 f"🎲 *Random movie selected:* {movie.title}" + 
                 (f" ({movie.year})" if movie.year else "") + 
                 "\nForwarding now...",
-                parse_mode='Markdown'
+                parse_mode=ParseMode.MARKDOWN
             )
             
             # Forward the movie
@@ -105,7 +93,7 @@ async def get_movie(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             
             # Log the request
-            RequestLog.create(
+            log_request(
                 user_id=update.effective_user.id,
                 movie_id=movie.id,
                 group_id=update.effective_chat.id
@@ -140,16 +128,20 @@ async def get_movie(update: Update, context: ContextTypes.DEFAULT_TYPE):
             # Otherwise just search by title
             query = query.where(Movie.title.contains(title))
         
-        # Check if multiple matches exist
-        count = query.count()
+        with db.connection_context():
+            # Check if multiple matches exist
+            count = query.count()
+            
+            if count > 1:
+                movies = list(query.limit(10))
+            elif count == 1:
+                movie = query.get()
         
         if count == 0:
             raise DoesNotExist("Movie not found")
         
         if count > 1:
             # Multiple matches found, show as buttons
-            movies = query.limit(10)
-            
             results = f"🎬 *Multiple matches for '{title}'*" + (f" ({year})" if year else "") + "\n\n"
             results += "Please select the movie you want:\n"
             
@@ -167,20 +159,18 @@ async def get_movie(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text(
                 results,
                 reply_markup=reply_markup,
-                parse_mode='Markdown'
+                parse_mode=ParseMode.MARKDOWN
             )
             return
             
         # Single match found, proceed with forwarding
-        movie = query.get()
-        
         logger.info(f"Found movie: {movie.title} ({movie.year}), message_id: {movie.message_id}")
         
         # Send a "processing" message
         processing_msg = await update.message.reply_text(
             f"Found movie: *{movie.title}*" + (f" ({movie.year})" if movie.year else "") + 
             "\nForwarding now...",
-            parse_mode='Markdown'
+            parse_mode=ParseMode.MARKDOWN
         )
         
         try:
@@ -196,7 +186,7 @@ async def get_movie(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await processing_msg.delete()
             
             # Log the request
-            RequestLog.create(
+            log_request(
                 user_id=user_id,
                 movie_id=movie.id,
                 group_id=chat_id
@@ -210,18 +200,19 @@ async def get_movie(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await processing_msg.edit_text(
                 f"Error forwarding the movie: {error_msg}\n"
                 "Please contact the administrator.",
-                parse_mode='Markdown'
+                parse_mode=ParseMode.MARKDOWN
             )
         
     except DoesNotExist:
         logger.info(f"Movie not found: '{title}'" + (f" ({year})" if year else ""))
         
         # If exact match not found, try to find similar titles
-        similar_movies = Movie.select().where(
-            Movie.title.contains(title)
-        ).limit(5)
+        with db.connection_context():
+            similar_movies = list(Movie.select().where(
+                Movie.title.contains(title)
+            ).limit(5))
         
-        if similar_movies.count() > 0:
+        if similar_movies:
             # Suggest similar movies
             suggestions = "Did you mean one of these?\n"
             for movie in similar_movies:
@@ -231,7 +222,7 @@ async def get_movie(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text(
                 f"Sorry, I couldn't find the exact movie '{title}'" + 
                 (f" ({year})" if year else "") + ".\n\n" + suggestions,
-                parse_mode='Markdown'
+                parse_mode=ParseMode.MARKDOWN
             )
         else:
             await update.message.reply_text(
@@ -251,13 +242,20 @@ async def get_movie_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
     
     try:
         # Get the movie from database
-        movie = Movie.get_by_id(movie_id)
+        with db.connection_context():
+            movie = get_movie_by_id(movie_id)
+        
+        if movie is None:
+            logger.warning(f"Movie with ID {movie_id} not found in database")
+            await query.edit_message_text("Sorry, this movie is no longer available.")
+            return
+        
         logger.info(f"Found movie: {movie.title} ({movie.year}), message_id: {movie.message_id}")
         
         # Send a confirmation message
         await query.edit_message_text(
             f"Sending movie: *{movie.title}*" + (f" ({movie.year})" if movie.year else ""),
-            parse_mode='Markdown'
+            parse_mode=ParseMode.MARKDOWN
         )
         
         try:
@@ -270,7 +268,7 @@ async def get_movie_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
             logger.info(f"Successfully forwarded movie {movie.id} to chat {update.effective_chat.id}")
             
             # Log the request
-            RequestLog.create(
+            log_request(
                 user_id=update.effective_user.id,
                 movie_id=movie.id,
                 group_id=update.effective_chat.id
@@ -284,9 +282,6 @@ async def get_movie_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 "Please contact the administrator."
             )
         
-    except DoesNotExist:
-        logger.warning(f"Movie with ID {movie_id} not found in database")
-        await query.edit_message_text("Sorry, this movie is no longer available.")
     except Exception as e:
         logger.error(f"Error processing movie request: {str(e)}")
         await query.edit_message_text(
@@ -298,14 +293,15 @@ async def search_movie(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not context.args:
         await update.message.reply_text(
             "Please provide a search term: `/search movie title`",
-            parse_mode='Markdown'
+            parse_mode=ParseMode.MARKDOWN
         )
         return
     
     search_term = ' '.join(context.args)
     
     # Search for movies that match the search term
-    movies = Movie.select().where(Movie.title.contains(search_term)).limit(10)
+    with db.connection_context():
+        movies = list(Movie.select().where(Movie.title.contains(search_term)).limit(10))
     
     if not movies:
         await update.message.reply_text(f"No movies found matching '{search_term}'.")
@@ -318,4 +314,4 @@ async def search_movie(update: Update, context: ContextTypes.DEFAULT_TYPE):
         year_str = f" ({movie.year})" if movie.year else ""
         results.append(f"• *{movie.title}*{year_str}")
     
-    await update.message.reply_text("\n".join(results), parse_mode='Markdown')
+    await update.message.reply_text("\n".join(results), parse_mode=ParseMode.MARKDOWN)
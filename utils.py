@@ -1,6 +1,23 @@
 import logging
 import re
-from typing import Tuple, Optional
+from functools import lru_cache
+from typing import Tuple, Optional, AbstractSet
+from telegram.helpers import escape_markdown
+from telegram.error import BadRequest
+from config import ADMIN_IDS
+from database import save_photo_file_id
+
+logger = logging.getLogger(__name__)
+
+# Photo shown with the welcome message and the channel join prompt
+WELCOME_PHOTO_URL = "https://i.ibb.co/N6b3MVpj/1741892600514.jpg"
+
+# Telegram file IDs for photos already sent from a URL, so Telegram doesn't fetch them again;
+# filled from the database at startup
+photo_file_ids = {}
+
+# Pattern to match title and optional year in parentheses
+MOVIE_TITLE_PATTERN = re.compile(r"(.+?)(?:\s*\((\d{4})\))?$")
 
 def parse_movie_title(text: str) -> Tuple[str, Optional[int]]:
     """
@@ -8,29 +25,70 @@ def parse_movie_title(text: str) -> Tuple[str, Optional[int]]:
     Example input: "The Matrix (1999)"
     Returns: ("The Matrix", 1999)
     """
-    # Pattern to match title and optional year in parentheses
-    pattern = r"(.+?)(?:\s*\((\d{4})\))?$"
-    match = re.match(pattern, text.strip())
+    text = text.strip()
+    
+    # Without a closing parenthesis there is no year to extract, so skip the regex
+    if not text.endswith(")"):
+        return text, None
+    
+    match = MOVIE_TITLE_PATTERN.match(text)
     
     if match:
         title = match.group(1).strip()
         year = int(match.group(2)) if match.group(2) else None
         return title, year
     
-    return text.strip(), None
+    return text, None
 
-def is_admin(user_id: int, admin_ids: list) -> bool:
+@lru_cache(maxsize=256)
+def is_admin(user_id: int) -> bool:
     """Check if user is an admin."""
-    return user_id in admin_ids
+    return user_id in ADMIN_IDS
 
-def is_authorized_group(group_id: int, auth_groups: list) -> bool:
+def is_authorized_group(group_id: int, auth_groups: AbstractSet[int]) -> bool:
     """Check if group is authorized."""
     return group_id in auth_groups
 
+def safe_md(text: str) -> str:
+    """Escape user-supplied text for use outside entities in a Markdown message."""
+    return escape_markdown(text)
+
+async def send_cached_photo(send_photo, photo_url: str, **kwargs):
+    """
+    Send a photo from a URL once, then reuse the file ID Telegram assigned to it.
+    
+    Args:
+        send_photo: The method to send with, e.g. message.reply_photo
+        photo_url: URL of the photo
+        **kwargs: Passed on to send_photo
+    
+    Returns:
+        Message: The sent message
+    """
+    file_id = photo_file_ids.get(photo_url)
+    if file_id is not None:
+        try:
+            return await send_photo(photo=file_id, **kwargs)
+        except BadRequest as e:
+            # A stored file ID can stop working, e.g. after the bot token changes
+            logger.warning(f"Cached file ID for {photo_url} was rejected, sending the URL instead: {e}")
+            photo_file_ids.pop(photo_url, None)
+    
+    message = await send_photo(photo=photo_url, **kwargs)
+    if message.photo:
+        file_id = message.photo[-1].file_id
+        photo_file_ids[photo_url] = file_id
+        try:
+            save_photo_file_id(photo_url, file_id)
+        except Exception as e:
+            # The photo was sent; the ID just won't outlive a restart
+            logger.error(f"Failed to store file ID for {photo_url}: {e}")
+    return message
+
 def format_movie_info(movie) -> str:
     """Format movie information for display."""
     year_str = f" ({movie.year})" if movie.year else ""
-    description = f"\n\n{movie.description}" if movie.description else ""
+    description = f"\n\n{safe_md(movie.description)}" if movie.description else ""
     
     return f"🎬 *{movie.title}*{year_str}{description}"
   